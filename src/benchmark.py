@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# Measure the throughput of the conversion hot paths on synthetic inputs.
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from lib import (animation, bdf, codepages, dither, fade, fontindex, oklab,
+                 textmode, vgacolor)
+from lib.font import Font
+from lib.palette import Palette
+from lib.scripts import load_script
+
+# Registered benchmarks: name -> (setup function, items per run)
+BENCHMARKS = {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the conversion code on synthetic inputs"
+    )
+    parser.add_argument(
+        "--output", "-o", type=str,
+        help="write results to this JSON file (default: stdout)")
+    parser.add_argument(
+        "--compare", "-c", type=str, metavar="BASELINE",
+        help="compare against a previous JSON results file")
+    parser.add_argument(
+        "--threshold", "-t", type=float, default=0.10,
+        help="""slowdown that counts as a regression when comparing, as a
+            fraction (default: %(default)s)""")
+    parser.add_argument(
+        "--filter", "-k", type=str, default="",
+        help="only run benchmarks whose names contain this string")
+    parser.add_argument(
+        "--repeat", "-r", type=int, default=5,
+        help="number of timed runs per benchmark (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    for name, (setup, items) in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results["results"][name] = run_benchmark(setup, items, args.repeat)
+        r = results["results"][name]
+        print(f"{name:32} {r['median']*1000:10.3f} ms "
+              f"{r['items_per_sec']:14.0f} items/s", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+def run_benchmark(setup, items, repeat):
+    """Times a benchmark, returning a dict of statistics (times in seconds)"""
+    func = setup()
+    func()  # Warm up caches, lazy imports, etc.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "median": median,
+        "min": min(times),
+        "runs": repeat,
+        "items": items,
+        "items_per_sec": items / median,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Prints a comparison table, returning the names of any regressions"""
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:32} (new)", file=sys.stderr)
+            continue
+        ratio = result["median"] / old["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "improved"
+        print(f"{name:32} {ratio:8.2f}x time  {flag}", file=sys.stderr)
+    return regressions
+
+
+def benchmark(name, items):
+    """Registers a setup function, which returns the function to be timed"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, items)
+        return setup
+    return register
+
+
+def random_palette(rng, size=16):
+    colors = (rng.integers(0, 64, (size, 3))/63).tolist()
+    return Palette([tuple(c) for c in colors])
+
+
+def synthetic_bdf(rng, width=7, height=13):
+    """Returns BDF text with glyphs for every CP437 character"""
+    codepoints = sorted(set(codepages.CODEPAGES["cp437"].codepoints))
+    lines = [
+        "STARTFONT 2.1",
+        "FONT -synthetic",
+        f"SIZE {height} 75 75",
+        f"FONTBOUNDINGBOX {width} {height} 0 -2",
+        f"CHARS {len(codepoints)}",
+    ]
+    for cp in codepoints:
+        rows = rng.integers(0, 256, height)
+        lines += [
+            f"STARTCHAR u{cp:04X}",
+            f"ENCODING {cp}",
+            f"DWIDTH {width} 0",
+            f"BBX {width} {height} 0 -2",
+            "BITMAP",
+            *(f"{row:02X}" for row in rows),
+            "ENDCHAR",
+        ]
+    lines.append("ENDFONT")
+    return "\n".join(lines) + "\n"
+
+
+@benchmark("oklab.to_oklab", 1000)
+def bench_to_oklab():
+    colors = [tuple(c) for c in np.random.default_rng(0).random((1000, 3))]
+    return lambda: [oklab.to_oklab(c) for c in colors]
+
+
+@benchmark("oklab.to_srgb", 1000)
+def bench_to_srgb():
+    rng = np.random.default_rng(0)
+    colors = [oklab.to_oklab(tuple(c)) for c in rng.random((1000, 3))]
+    return lambda: [oklab.to_srgb(c) for c in colors]
+
+
+@benchmark("oklab.to_oklab_array", 640*480)
+def bench_to_oklab_array():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    return lambda: oklab.to_oklab_array(image)
+
+
+@benchmark("oklab.to_srgb_array", 640*480)
+def bench_to_srgb_array():
+    rng = np.random.default_rng(0)
+    lab = oklab.to_oklab_array(rng.random((480, 640, 3)))
+    return lambda: oklab.to_srgb_array(lab)
+
+
+@benchmark("vgacolor.nearest_vga", 10000)
+def bench_nearest_vga():
+    lab = oklab.to_oklab_array(np.random.default_rng(0).random((10000, 3)))
+    vgacolor.table()
+    return lambda: vgacolor.nearest_vga(lab)
+
+
+@benchmark("Palette.from_text", 100)
+def bench_from_text():
+    rng = np.random.default_rng(0)
+    texts = []
+    for _ in range(100):
+        colors = rng.integers(0, 256, (16, 3))
+        texts.append("GIMP Palette\nName: bench\nColumns: 4\n#\n" + "".join(
+            f"{r:3} {g:3} {b:3}\tUntitled\n" for r, g, b in colors))
+    return lambda: [Palette.from_text(t) for t in texts]
+
+
+@benchmark("Palette.from_bytes", 1000)
+def bench_from_bytes():
+    rng = np.random.default_rng(0)
+    data = [bytes(rng.integers(0, 64, 48).tolist()) for _ in range(1000)]
+    return lambda: [Palette.from_bytes(d) for d in data]
+
+
+@benchmark("Palette.__bytes__", 1000)
+def bench_to_bytes():
+    rng = np.random.default_rng(0)
+    palettes = [random_palette(rng) for _ in range(1000)]
+    # Palettes cache their bytes, so time fresh copies to measure conversion
+    return lambda: [bytes(Palette(p.rgb)) for p in palettes]
+
+
+@benchmark("Palette.reorder", 100)
+def bench_reorder():
+    rng = np.random.default_rng(0)
+    goal = random_palette(rng)
+    palettes = [random_palette(rng) for _ in range(100)]
+    return lambda: [p.reorder(goal) for p in palettes]
+
+
+@benchmark("fade.blend+to_vga", 10000)
+def bench_fade():
+    rng = np.random.default_rng(0)
+    start = random_palette(rng)
+    end = random_palette(rng)
+    return lambda: fade.to_vga(fade.blend(start, end, 10000), dedupe=True)
+
+
+@benchmark("dither.floyd-steinberg", 320*200)
+def bench_dither_diffusion():
+    rng = np.random.default_rng(0)
+    palette = random_palette(rng)
+    im = Image.fromarray(rng.integers(0, 256, (200, 320, 3), dtype=np.uint8))
+    return lambda: dither.dither(im, palette)
+
+
+@benchmark("dither.bayer", 320*200)
+def bench_dither_ordered():
+    rng = np.random.default_rng(0)
+    palette = random_palette(rng)
+    im = Image.fromarray(rng.integers(0, 256, (200, 320, 3), dtype=np.uint8))
+    return lambda: dither.dither(im, palette, method="bayer")
+
+
+@benchmark("textmode.render", 100)
+def bench_render_screen():
+    rng = np.random.default_rng(0)
+    font = Font(rng.integers(0, 256, 256*16, dtype=np.uint8).tobytes())
+    palette = random_palette(rng)
+    screens = [rng.integers(0, 256, (2, 25, 80), dtype=np.uint8)
+               for _ in range(100)]
+    return lambda: [textmode.render(c, a, font, palette) for c, a in screens]
+
+
+@benchmark("animation.convert", 30)
+def bench_animation():
+    rng = np.random.default_rng(0)
+    font = Font(rng.integers(0, 256, 256*16, dtype=np.uint8).tobytes())
+    palette = random_palette(rng)
+    frames = []
+    pixels = rng.integers(0, 256, (400, 640, 3), dtype=np.uint8)
+    for i in range(30):
+        pixels = pixels.copy()
+        pixels[i*10:i*10 + 48, i*16:i*16 + 64] = 255
+        frames.append(Image.fromarray(pixels))
+    converter = animation.AnimationConverter(font, palette)
+    return lambda: list(converter.convert(frames))
+
+
+@benchmark("fontindex.nearest", 1000*256)
+def bench_font_nearest():
+    rng = np.random.default_rng(0)
+    packed = rng.integers(0, 2**63, (1000, 256, fontindex.WORDS),
+                          dtype=np.uint64)
+    index = fontindex.FontIndex([f"font{i}" for i in range(1000)], packed)
+    return lambda: index.nearest(packed[0, 65])
+
+
+@benchmark("Palette.reorder[256]", 10)
+def bench_reorder_256():
+    rng = np.random.default_rng(0)
+    goal = random_palette(rng, 256)
+    palettes = [random_palette(rng, 256) for _ in range(10)]
+    return lambda: [p.reorder(goal) for p in palettes]
+
+
+@benchmark("bdf.parse+draw", 1)
+def bench_bdf_decode():
+    text = synthetic_bdf(np.random.default_rng(0))
+
+    def run():
+        bounding_box, glyphs = bdf.parse(text)
+        return [bdf.draw(g, bounding_box) for g in glyphs]
+    return run
+
+
+@benchmark("convert-bdf.resize", 256)
+def bench_resize():
+    convert_bdf = load_script("convert-bdf")
+    bitmaps = np.random.default_rng(0).integers(0, 2, (256, 13, 7))
+    extend = np.isin(np.arange(256), list(convert_bdf.parse_byte_ranges(
+        convert_bdf.DRAWING_CHARS)))
+    return lambda: convert_bdf.resize(bitmaps, 8, 16, extend)
+
+
+@benchmark("convert-bdf.to_bytes", 256)
+def bench_bdf_to_bytes():
+    convert_bdf = load_script("convert-bdf")
+    bitmaps = np.random.default_rng(0).integers(0, 2, (256, 16, 8))
+    bitmaps = bitmaps.astype(np.uint8)
+    return lambda: convert_bdf.to_bytes(bitmaps)
+
+
+@benchmark("image_to_font", 1)
+def bench_image_to_font():
+    image_to_font = load_script("image-to-font")
+    bits = np.random.default_rng(0).integers(0, 2, (8*14, 256), dtype=bool)
+    sheet = Image.fromarray(bits)
+    return lambda: image_to_font.image_to_font_data(sheet)
+
+
+@benchmark("font_to_image", 1)
+def bench_font_to_image():
+    image_to_font = load_script("image-to-font")
+    data = np.random.default_rng(0).integers(0, 256, 256*14, dtype=np.uint8)
+    font = Font(data.tobytes())
+    output = tempfile.NamedTemporaryFile(suffix=".png")
+
+    def run():
+        image_to_font.font_to_image(font, output.name)
+    run.output = output  # Keep the temp file alive while benchmarking
+    return run
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from lib import goodies
+from lib.scripts import load_script
+
+# Bump this whenever the manifest layout or the rule keys change
+MANIFEST_VERSION = 1
+
+DEFAULT_MANIFEST = goodies.GOODIES_DIR / ".build-manifest.json"
+DEFAULT_FONT_RULES = goodies.FONTS_DIR / "rules.json"
+
+# An output file, the files it's made from, and how it's made from them.
+# kind is "palette" or "font", and params are passed to the builder.
+Rule = collections.namedtuple("Rule", "output kind inputs params")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="""
+            Rebuild the generated files in goodies/, skipping any whose
+            inputs, parameters and code haven't changed since the last build
+            """
+    )
+    parser.add_argument(
+        "outputs", type=str, nargs="*",
+        help="only consider these outputs (default: all of them)")
+    parser.add_argument(
+        "--font-rules", type=str, default=str(DEFAULT_FONT_RULES),
+        help=f"""
+            JSON file describing how to build fonts from BDF files (default:
+            {DEFAULT_FONT_RULES.relative_to(goodies.SRC_DIR.parent)}, if it
+            exists). It holds a list of objects with keys "output",
+            "source", and optionally "height", "extend_chars" and
+            "codepage", with the same meanings as in convert-bdf.py.
+            Relative paths are relative to the JSON file.
+            """
+    )
+    parser.add_argument(
+        "--manifest", type=str, default=str(DEFAULT_MANIFEST),
+        help="where to record what was built from what")
+    parser.add_argument(
+        "--force", "-f", action="store_true",
+        help="rebuild everything, even if it seems up to date")
+    parser.add_argument(
+        "--dry-run", "-n", action="store_true",
+        help="list the outputs that would be rebuilt, without building them")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    rules = palette_rules() + font_rules(args.font_rules)
+    if args.outputs:
+        wanted = {pathlib.Path(x).resolve() for x in args.outputs}
+        rules = [r for r in rules if r.output.resolve() in wanted]
+        missing = wanted - {r.output.resolve() for r in rules}
+        if missing:
+            sys.exit(f"No rule for {', '.join(map(str, sorted(missing)))}")
+
+    manifest = Manifest(args.manifest)
+    stale = []
+    for rule in rules:
+        try:
+            key = manifest.rule_key(rule)
+        except FileNotFoundError as e:
+            sys.exit(str(e))
+        if args.force or manifest.is_stale(rule, key):
+            stale.append((rule, key))
+    if args.dry_run:
+        for rule, _ in stale:
+            print(rule.output)
+        return
+
+    start = time.perf_counter()
+    for rule, key, error in build_all(stale, args.jobs):
+        if error:
+            print(f"{rule.output}: {error}", file=sys.stderr)
+        else:
+            manifest.record(rule, key)
+            print(f"Built {rule.output}", file=sys.stderr)
+    manifest.save()
+    elapsed = time.perf_counter() - start
+    print(f"{len(rules) - len(stale)} of {len(rules)} outputs up to date, "
+          f"{len(stale)} rebuilt in {elapsed:.2f}s", file=sys.stderr)
+
+
+def palette_rules():
+    """Returns the rules for the procedurally generated palettes"""
+    rules = []
+    for filename, (generator, goal) in goodies.PALETTE_RULES.items():
+        inputs = list(goodies.PALETTE_CODE)
+        if goal:
+            inputs.append(goodies.PALETTES_DIR / goal)
+        params = {"generator": generator, "goal": goal}
+        rules.append(
+            Rule(goodies.PALETTES_DIR / filename, "palette", inputs, params))
+    return rules
+
+
+def font_rules(filename):
+    """Returns the rules listed in a font rules file, if it exists"""
+    path = pathlib.Path(filename)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        entries = json.load(f)
+    rules = []
+    for entry in entries:
+        source = path.parent / entry["source"]
+        params = {
+            "source": entry["source"],
+            "height": entry.get("height"),
+            "extend_chars": entry.get("extend_chars"),
+            "codepage": entry.get("codepage"),
+        }
+        inputs = list(goodies.FONT_CODE) + [source]
+        rules.append(
+            Rule(path.parent / entry["output"], "font", inputs, params))
+    return rules
+
+
+def build_all(jobs, processes=None):
+    """Builds (rule, key) pairs, yielding (rule, key, error or None).
+
+    The rules must be independent of each other: no rule's output can be
+    another rule's input. They're built by a pool of worker processes.
+    """
+    if processes == 1 or len(jobs) <= 1:
+        yield from map(_build_job, jobs)
+        return
+    import multiprocessing
+    processes = min(processes or os.cpu_count(), len(jobs))
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(_build_job, jobs)
+
+
+def _build_job(job):
+    """Worker for build_all(). Returns (rule, key, error or None)"""
+    rule, key = job
+    try:
+        BUILDERS[rule.kind](rule)
+    except (OSError, ValueError, KeyError, SystemExit) as e:
+        return rule, key, e
+    return rule, key, None
+
+
+def build_palette(rule):
+    procedural_palettes = load_script("procedural-palettes")
+    procedural_palettes.generate_goodie(rule.output.name)
+
+
+def build_font(rule):
+    convert_bdf = load_script("convert-bdf")
+    source = rule.inputs[-1]
+    argv = [str(source), str(rule.output)]
+    if rule.params["height"] is not None:
+        argv += ["--height", str(rule.params["height"])]
+    if rule.params["extend_chars"] is not None:
+        argv += ["--extend-chars", rule.params["extend_chars"]]
+    if rule.params["codepage"] is not None:
+        argv += ["--codepage", rule.params["codepage"]]
+    convert_bdf.main(argv)
+
+
+BUILDERS = {
+    "palette": build_palette,
+    "font": build_font,
+}
+
+
+class Manifest:
+    """Remembers which rule key produced each output, and file hashes.
+
+    File hashes are stored with each file's size and modification time, so
+    that unchanged files don't have to be read again: checking whether
+    everything is up to date only takes a few stat() calls.
+    """
+
+    def __init__(self, filename):
+        self.filename = pathlib.Path(filename)
+        self.files = {}
+        self.outputs = {}
+        self.dirty = False
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.files = data["files"]
+            self.outputs = data["outputs"]
+
+    def file_hash(self, path):
+        """Returns the SHA-256 of a file's contents, or None if it's missing"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        name = self._name(path)
+        cached = self.files.get(name)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.files[name] = [st.st_size, st.st_mtime_ns, digest]
+        self.dirty = True
+        return digest
+
+    def rule_key(self, rule):
+        """Returns a hash of everything that goes into building an output"""
+        inputs = {self._name(p): self.file_hash(p) for p in rule.inputs}
+        missing = [name for name, digest in inputs.items() if digest is None]
+        if missing:
+            raise FileNotFoundError(
+                f"Missing inputs for {rule.output}: {', '.join(missing)}")
+        key = json.dumps([rule.kind, rule.params, inputs], sort_keys=True)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def is_stale(self, rule, key):
+        """Whether the output is missing, modified, or built from old inputs"""
+        entry = self.outputs.get(self._name(rule.output))
+        return (entry is None or entry["key"] != key
+                or entry["hash"] != self.file_hash(rule.output))
+
+    def record(self, rule, key):
+        """Records that the output was just built"""
+        self.outputs[self._name(rule.output)] = {
+            "key": key,
+            "hash": self.file_hash(rule.output),
+        }
+        self.dirty = True
+
+    def save(self):
+        """Writes the manifest atomically, if anything has changed"""
+        if not self.dirty:
+            return
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": self.files,
+            "outputs": self.outputs,
+        }
+        fd, tmp_name = tempfile.mkstemp(dir=self.filename.parent)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp_name, self.filename)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        self.dirty = False
+
+    def _name(self, path):
+        """Names files relative to the repo, so the manifest can be moved"""
+        path = pathlib.Path(path).resolve()
+        try:
+            return str(path.relative_to(goodies.SRC_DIR.parent))
+        except ValueError:
+            return str(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,85 @@
 #!/usr/bin/env python
 import argparse
+import collections
 import sys
-from typing import List, Optional
 
-import bdfparser
 import numpy as np
 
+from lib import bdf, cache, codepages, instrument
+
 DRAWING_CHARS = "8,10,176-223"
 
+Target = collections.namedtuple(
+    "Target", "output_file height extend_chars codepage")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.no_cache:
+        glyphs = bdf.load(args.bdf_file)
+    else:
+        glyphs = bdf.load(args.bdf_file, args.cache_dir)
+
+    if args.coverage:
+        print_coverage(glyphs)
+
+    # Choose glyphs from font once per codepage
+    selected = {}
+    for target in args.targets:
+        if target.codepage not in selected:
+            with instrument.stage("font.select"):
+                selected[target.codepage] = select_bitmaps(
+                    glyphs, target.codepage)
+        write_font(selected[target.codepage], target)
+
+
+def select_bitmaps(glyphs: bdf.GlyphIndex, codepage: str) -> np.array:
+    """Returns the font's glyphs for a codepage, as a (256, h, w) array"""
+    codepoints = codepages.select(codepages.get(codepage), glyphs.index)
+    bitmaps = np.zeros((256,) + glyphs.bitmaps.shape[1:], dtype=np.uint8)
+    for i, codepoint in enumerate(codepoints):
+        if codepoint is None:
+            # Leave the glyph blank
+            print(f"Warning: no glyph for char {i} in {codepage}",
+                  file=sys.stderr)
+        else:
+            bitmaps[i] = glyphs.get(codepoint)
+    return bitmaps
+
 
-def main():
-    args = parse_args()
-    font = bdfparser.Font(args.bdf_file)
+def print_coverage(glyphs: bdf.GlyphIndex):
+    """Lists the characters of each known codepage that the font lacks"""
+    pages = list(codepages.CODEPAGES.values())
+    missing = codepages.coverage(pages, glyphs.index)
+    for codepage in pages:
+        chars = missing[codepage.name]
+        print(f"{codepage.name}: {256 - len(chars)}/256 characters")
+        for char in chars:
+            codepoint = codepage.codepoints[char]
+            print(f"  missing {char:3} U+{codepoint:04X} {chr(codepoint)}")
 
-    # Choose glyphs from font and convert them to bitmaps
-    bitmaps = [get_bitmap_for_character(font, i) for i in range(256)]
 
+def write_font(bitmaps: np.array, target: Target):
+    """Writes a DOS font file for the given target settings"""
     # Make sure we're settled on the desired glyph height
-    height = args.height
+    height = target.height
     if not height:
-        height = max(len(b) for b in bitmaps if b is not None)
-
-    # Make sure we have bitmaps for all the characters
-    fallback_bitmap = np.zeros((height, 8), dtype=np.uint8)
-    for i in range(len(bitmaps)):
-        if bitmaps[i] is None:
-            print(f"Warning: no glyph for char {i}", file=sys.stderr)
-            bitmaps[i] = fallback_bitmap
+        height = bitmaps.shape[1]
 
     # Make the bitmaps all the same size
-    for i in range(len(bitmaps)):
-        bitmaps[i] = resize(bitmaps[i], 8, height, i in args.extend_chars)
+    with instrument.stage("font.resize"):
+        extend = np.isin(np.arange(256), list(target.extend_chars))
+        bitmaps = resize(bitmaps, 8, height, extend)
 
     # Write them to disk
-    with open(args.output_file, "wb") as f:
-        f.write(b"".join(to_bytes(b) for b in bitmaps))
+    with instrument.stage("font.pack"):
+        data = to_bytes(bitmaps)
+    with instrument.stage("font.write"):
+        with open(target.output_file, "wb") as f:
+            f.write(data)
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="A tool for converting BDF fonts into DOS font format"
     )
@@ -46,7 +88,7 @@ def parse_args():
         help="BDF font file to convert"
     )
     parser.add_argument(
-        "output_file", type=str, metavar="OUTPUT-FILE",
+        "output_file", type=str, metavar="OUTPUT-FILE", nargs="?",
         help="Filename of resulting DOS font file"
     )
     parser.add_argument(
@@ -64,7 +106,74 @@ def parse_args():
             defaults to "{DRAWING_CHARS}" (mostly CP437's box/line chars).
             """
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--codepage", "-c", type=str, default="cp437",
+        help=f"""
+            Codepage to pick glyphs for, from: {", ".join(codepages.NAMES)}.
+            Defaults to "%(default)s".
+            """
+    )
+    parser.add_argument(
+        "--target", "-t", type=str, action="append", default=[],
+        metavar="OUTPUT-FILE[:height=ROWS][:extend=CHARS][:codepage=NAME]",
+        help="""
+            Write an additional DOS font file from the same BDF font. Settings
+            that aren't given default to the values of --height,
+            --extend-chars and --codepage. May be repeated; the BDF file is
+            only parsed once.
+            """
+    )
+    parser.add_argument(
+        "--coverage", action="store_true",
+        help="List the characters of each known codepage the font lacks"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str, metavar="DIR",
+        default=cache.default_cache_dir(),
+        help="""
+            Directory for caching decoded BDF glyphs, keyed by the BDF file's
+            contents. Defaults to "%(default)s".
+            """
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Always parse the BDF file, and don't write to the cache"
+    )
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    args.targets = []
+    try:
+        args.codepage = codepages.get(args.codepage).name
+        if args.output_file:
+            args.targets.append(Target(
+                args.output_file, args.height, args.extend_chars,
+                args.codepage))
+        for s in args.target:
+            args.targets.append(parse_target(
+                s, args.height, args.extend_chars, args.codepage))
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.targets and not args.coverage:
+        parser.error("no output files given")
+    return args
+
+
+def parse_target(s, height, extend_chars, codepage="cp437") -> Target:
+    """Parses strings like "out.f14:height=14:extend=176-223" into a Target"""
+    output_file, *settings = s.split(":")
+    for setting in settings:
+        key, _, value = setting.partition("=")
+        if key == "height":
+            height = int(value)
+        elif key == "extend":
+            extend_chars = parse_byte_ranges(value) if value else set()
+        elif key == "codepage":
+            codepage = codepages.get(value).name
+        else:
+            raise ValueError(f'Unknown target setting "{setting}"')
+    return Target(output_file, height, extend_chars, codepage)
 
 
 def parse_byte_ranges(s):
@@ -89,60 +198,17 @@ def parse_byte_ranges(s):
     return result
 
 
-def get_bitmap_for_character(
-    font: bdfparser.Font,
-    char: int
-) -> Optional[np.array]:
-    """Returns a bitmap from the font that can represent the given CP437 code.
+def resize(bitmaps: np.array, new_width, new_height, extend=False):
+    """Pads or crops a (num_glyphs, height, width) array of glyph bitmaps.
 
-    If no suitable glyph can be found, returns None.
+    Lines are added or removed evenly on opposite sides of each glyph. For
+    glyphs where extend is true (either a single bool, or one bool per
+    glyph), new lines continue any repeating pattern at that edge instead of
+    being blank.
     """
-    codepoints = get_codepoints_for_cp437(char)
-    available = font.glyphs.keys()
-    for codepoint in codepoints:
-        if codepoint in available:
-            glyph = font.glyphbycp(codepoint)
-            bitmap = to_bitmap(glyph)
-            return bitmap
-    return None
-
-
-def get_codepoints_for_cp437(x) -> List[int]:
-    """Returns possible Unicode codepoints for the given CP437 character.
-
-    This function returns a list because that allows for potential fallback
-    codepoints if the font does not have complete coverage. Currently, though,
-    this implementation only returns 1 codepoint for each character.
-    """
-    # Handle printable ASCII chars
-    if x >= 32 and x <= 126:
-        return [x]
-
-    # Handle control chars, extended ASCII
-    LOWER = " ☺☻♥♦♣♠•◘○◙♂♀♪♫☼►◄↕‼¶§▬↨↑↓→←∟↔▲▼"
-    UPPER = "⌂" \
-        "ÇüéâäàåçêëèïîìÄÅÉæÆôöòûùÿÖÜ¢£¥₧ƒ" \
-        "áíóúñÑªº¿⌐¬½¼¡«»░▒▓│┤╡╢╖╕╣║╗╝╜╛┐" \
-        "└┴┬├─┼╞╟╚╔╩╦╠═╬╧╨╤╥╙╘╒╓╫╪┘┌█▄▌▐▀" \
-        "αßΓπΣσµτΦϴΩδ∞∅∈∩≡±≥≤⌠⌡÷≈°∙·√ⁿ²■ "
-    if x < 32:
-        code = ord(LOWER[x])
-    else:
-        code = ord(UPPER[x - 127])
-    return [code]
-
-
-def to_bitmap(glyph: bdfparser.Glyph) -> np.array:
-    """Converts a Glyph into a 2D array of zeros and ones."""
-    lines = glyph.draw().todata()   # Array of strings like "10101"
-    return np.array(
-        [[int(bit) for bit in line] for line in lines],
-        dtype=np.uint8
-    )
-
-
-def resize(bitmap: np.array, new_width, new_height, extend=False):
-    height, width = bitmap.shape
+    bitmaps = np.asarray(bitmaps, dtype=np.uint8)
+    num_glyphs, height, width = bitmaps.shape
+    extend = np.broadcast_to(extend, (num_glyphs,))
 
     def split(diff):
         x = diff//2
@@ -152,58 +218,71 @@ def resize(bitmap: np.array, new_width, new_height, extend=False):
     add_top, add_bottom = split(new_height - height)
     add_left, add_right = split(new_width - width)
 
-    for add_lines in [add_left, add_top, add_right, add_bottom]:
-        bitmap = np.rot90(bitmap)
+    # Each edge is handled by a view of the bitmaps in which that edge is the
+    # last line along axis 1; the view is undone after adding lines to it.
+    edges = [
+        (add_left, lambda b: b.transpose(0, 2, 1)[:, ::-1]),
+        (add_top, lambda b: b[:, ::-1]),
+        (add_right, lambda b: b.transpose(0, 2, 1)),
+        (add_bottom, lambda b: b),
+    ]
+    inverses = [
+        lambda b: b[:, ::-1].transpose(0, 2, 1),
+        lambda b: b[:, ::-1],
+        lambda b: b.transpose(0, 2, 1),
+        lambda b: b,
+    ]
+    for (add_lines, to_view), from_view in zip(edges, inverses):
+        lines = to_view(bitmaps)
         if add_lines < 0:
             # Delete lines from base of array
-            bitmap = bitmap[:add_lines]
+            lines = lines[:, :add_lines]
         elif add_lines > 0:
-            # Add lines to base of array
-            _, current_width = bitmap.shape
-            new_lines_shape = (add_lines, current_width)
-            if extend:
-                pattern_length = max(get_pattern_length(bitmap), 1)
-                pattern = bitmap[-pattern_length:]
-                new_lines = np.resize(pattern, new_lines_shape)
-            else:
-                new_lines = np.zeros(new_lines_shape, dtype=np.uint8)
-            bitmap = np.concatenate([bitmap, new_lines])
-
-    return bitmap
-
-
-def get_pattern_length(bitmap: np.array, max_length=4):
-    """Measure the length of any repeating pattern at the bottom of the array.
-
-    For example, if the bottom rows were of the form ...ABCDECDE, this
-    function would return 3, because the three rows CDE repeat.
-
-    This function returns the length of the longest pattern it finds, not to
-    surpass max_length. Returns 0 if no repeating pattern is found.
+            # Add lines to base of array. Extended glyphs repeat the pattern
+            # found at their edge; the others get blank lines.
+            num_lines = lines.shape[1]
+            new_lines = np.zeros(
+                (num_glyphs, add_lines, lines.shape[2]), dtype=np.uint8)
+            if extend.any():
+                extended = lines[extend]
+                pattern_lengths = np.maximum(get_pattern_length(extended), 1)
+                rows = (num_lines - pattern_lengths[:, np.newaxis]
+                        + np.arange(add_lines) % pattern_lengths[:, np.newaxis])
+                new_lines[extend] = np.take_along_axis(
+                    extended, rows[:, :, np.newaxis], axis=1)
+            lines = np.concatenate([lines, new_lines], axis=1)
+        bitmaps = np.ascontiguousarray(from_view(lines))
+
+    return bitmaps
+
+
+def get_pattern_length(bitmaps: np.array, max_length=4):
+    """Measure the length of any repeating pattern at the bottom of each glyph.
+
+    For example, if the bottom rows of a glyph were of the form ...ABCDECDE,
+    this function would return 3 for it, because the three rows CDE repeat.
+
+    Takes a (num_glyphs, height, width) array, and returns an array with the
+    length of the longest pattern found in each glyph, not to surpass
+    max_length. Glyphs with no repeating pattern get a length of 0.
     """
-    height, _ = bitmap.shape
+    num_glyphs, height, _ = bitmaps.shape
     max_length = min(max_length, height//2)
 
-    for length in range(max_length, 1, -1):
-        a = bitmap[-length:]
-        b = bitmap[-2*length:-length]
-        if np.array_equal(a, b):
-            return length
-    return 0
+    result = np.zeros(num_glyphs, dtype=np.intp)
+    for length in range(2, max_length + 1):
+        a = bitmaps[:, -length:]
+        b = bitmaps[:, -2*length:-length]
+        result[np.all(a == b, axis=(1, 2))] = length
+    return result
 
 
-def to_bytes(bitmap: np.array):
-    height, width = bitmap.shape
+def to_bytes(bitmaps: np.array):
+    """Packs glyph bitmaps of shape (..., height, 8) into font data"""
+    height, width = bitmaps.shape[-2:]
     assert(1 <= height <= 32)
     assert(width == 8)
-
-    def to_byte(row):
-        result = 0
-        for bit in row:
-            result = (result << 1) + bit
-        return result
-
-    return bytes(to_byte(row) for row in bitmap)
+    return np.packbits(bitmaps, axis=-1).tobytes()
 
 
 if __name__ == "__main__":
@@ -1,12 +1,31 @@
 #!/usr/bin/env python3
-import sys
+import argparse
 
+from lib import instrument
 from lib.palette import Palette
 
-infile = sys.argv[1]
-outfile = sys.argv[2]
 
-with open(infile, "r") as f:
-    palette = Palette.from_text(f.read())
-with open(outfile, "wb") as f:
-    f.write(bytes(palette))
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a text-based palette to VGA format")
+    parser.add_argument("infile", type=str, help="palette file to convert")
+    parser.add_argument("outfile", type=str, help="name for the VGA palette")
+    parser.add_argument(
+        "--size", "-s", type=int, default=16,
+        help="""number of colors the palette must have, e.g. 256 for a mode
+            13h palette; 0 accepts any number up to 256 (default: 16)""")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with instrument.stage("file.read"):
+        with open(args.infile, "r") as f:
+            text = f.read()
+    palette = Palette.from_text(text, args.size or None)
+    with instrument.stage("file.write"):
+        with open(args.outfile, "wb") as f:
+            f.write(bytes(palette))
+
+
+if __name__ == "__main__":
+    main()
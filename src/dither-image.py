@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import argparse
+
+from PIL import Image
+
+from lib import dither, instrument
+from lib.palette import Palette
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Dither an image onto a 16-color VGA palette"
+    )
+    parser.add_argument("input", type=str, help="image file to convert")
+    parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    parser.add_argument("output", type=str, help="name for the converted file")
+    parser.add_argument(
+        "--method", "-m", type=str, choices=dither.METHODS,
+        default="floyd-steinberg",
+        help="dithering method (default: %(default)s)")
+    parser.add_argument(
+        "--serpentine", "-s", action="store_true",
+        help="alternate scan direction every row (much slower)")
+    parser.add_argument(
+        "--vga", action="store_true",
+        help="match against the palette's 6-bit VGA colors")
+    parser.add_argument(
+        "--spread", type=float, default=None,
+        help="strength of bayer dithering, in OKLAB units")
+    parser.add_argument(
+        "--raw", "-r", action="store_true",
+        help="write raw palette indexes (1 byte/pixel) instead of an image")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with open(args.palette, "rb") as f:
+        palette = Palette.from_bytes(f.read())
+    options = dict(method=args.method, serpentine=args.serpentine,
+                   vga=args.vga, spread=args.spread)
+
+    with Image.open(args.input) as im:
+        with instrument.stage("image.dither"):
+            if args.raw:
+                # Stream the indexes out a strip at a time
+                with open(args.output, "wb") as f:
+                    for strip in dither.dither_strips(im, palette, **options):
+                        f.write(strip.tobytes())
+            else:
+                result = dither.dither_image(im, palette, **options)
+        if not args.raw:
+            with instrument.stage("image.encode"):
+                result.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+
+from lib import fontbank
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pack many DOS fonts into a single font bank, and back"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="create a font bank from font files")
+    build_parser.add_argument("bank", type=str, help="font bank to create")
+    build_parser.add_argument(
+        "fonts", type=str, nargs="+",
+        help="font files, or directories of font files")
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="write fonts from a font bank back out to files")
+    extract_parser.add_argument("bank", type=str, help="font bank to read")
+    extract_parser.add_argument(
+        "output_dir", type=str, help="directory for the extracted fonts")
+    extract_parser.add_argument(
+        "names", type=str, nargs="*",
+        help="names or content hashes of fonts to extract (default: all)")
+
+    list_parser = subparsers.add_parser(
+        "list", help="list the fonts in a font bank")
+    list_parser.add_argument("bank", type=str, help="font bank to read")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        try:
+            build(args.bank, args.fonts)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "extract":
+        extract(args.bank, args.output_dir, args.names)
+    elif args.command == "list":
+        list_fonts(args.bank)
+
+
+def build(bank_name, paths):
+    """Builds a font bank, skipping any files that aren't fonts.
+
+    Raises ValueError if two fonts have the same file name.
+    """
+    fonts = []
+    seen = {}
+    for path in _expand(paths):
+        data = path.read_bytes()
+        if len(data) % 256 != 0 or not 1 <= len(data) // 256 <= 32:
+            print(f"Skipping {path}: not a DOS font", file=sys.stderr)
+            continue
+        # Fonts are named by file name alone, so these would collide
+        if path.name in seen:
+            raise ValueError(f"Two fonts named {path.name}: "
+                             f"{seen[path.name]} and {path}")
+        seen[path.name] = path
+        fonts.append((path.name, data))
+    fontbank.build(fonts, bank_name)
+
+
+def extract(bank_name, output_dir, names):
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with fontbank.FontBank(bank_name) as bank:
+        if not names:
+            names = bank.names()
+        for name in names:
+            if name in bank:
+                data = bytes(bank[name].data)
+            else:
+                try:
+                    data = bytes(bank.by_hash(name).data)
+                except (KeyError, ValueError):
+                    sys.exit(f"No font named {name} in {bank_name}")
+            (output_dir / name).write_bytes(data)
+
+
+def list_fonts(bank_name):
+    with fontbank.FontBank(bank_name) as bank:
+        for name, font in bank.items():
+            print(f"{fontbank.digest(font.data).hex()}  "
+                  f"{font.height:2}  {name}")
+
+
+def _expand(paths):
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.iterdir() if p.is_file())
+        else:
+            yield path
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+
+from lib import fontbank, fontindex
+from lib.font import Font
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare DOS fonts glyph by glyph"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser(
+        "diff", help="show which characters differ between two fonts")
+    diff_parser.add_argument("font_a", type=str, help="font file")
+    diff_parser.add_argument("font_b", type=str, help="font file")
+    diff_parser.add_argument(
+        "--all", "-a", action="store_true",
+        help="list every character, even those that match")
+
+    dupes_parser = subparsers.add_parser(
+        "dupes", help="find characters that look alike within a font")
+    dupes_parser.add_argument("font", type=str, help="font file")
+    dupes_parser.add_argument(
+        "--max-distance", "-d", type=int, default=0,
+        help="most differing pixels to still count as alike (default: 0)")
+
+    index_parser = subparsers.add_parser(
+        "index", help="pack a collection of fonts into a search index")
+    index_parser.add_argument("index", type=str, help="index file to create")
+    index_parser.add_argument(
+        "fonts", type=str, nargs="+",
+        help="font files, directories of them, or font banks")
+
+    nearest_parser = subparsers.add_parser(
+        "nearest", help="find the closest glyphs to one character of a font")
+    nearest_parser.add_argument("font", type=str, help="font file")
+    nearest_parser.add_argument(
+        "char", type=parse_char,
+        help="character code (e.g. 65 or 0x41), or an ASCII character")
+    nearest_parser.add_argument(
+        "fonts", type=str, nargs="+",
+        help="fonts to search: as for 'index', or a saved index")
+    nearest_parser.add_argument(
+        "-k", type=int, default=5, help="number of results to show")
+    nearest_parser.add_argument(
+        "--same-char", "-s", action="store_true",
+        help="only compare against the same character in each font")
+
+    args = parser.parse_args(argv)
+    if args.command == "diff":
+        diff(read_font(args.font_a), read_font(args.font_b), args.all)
+    elif args.command == "dupes":
+        font = read_font(args.font)
+        for a, b, distance in fontindex.duplicates(font, args.max_distance):
+            print(f"{a:3}\t{b:3}\t{distance}")
+    elif args.command == "index":
+        load_index(args.fonts).save(args.index)
+    elif args.command == "nearest":
+        glyph = fontindex.pack(read_font(args.font))[args.char]
+        index = load_index(args.fonts)
+        char = args.char if args.same_char else None
+        for match in index.nearest(glyph, args.k, char):
+            print(f"{match.distance}\t{match.char:3}\t{match.name}")
+
+
+def diff(font_a, font_b, show_all=False):
+    """Prints the number of differing pixels in each character"""
+    dists = fontindex.diff(font_a, font_b)
+    for char, distance in enumerate(dists):
+        if distance or show_all:
+            print(f"{char:3}\t{distance}")
+    print(f"{(dists > 0).sum()} of 256 characters differ, "
+          f"{dists.sum()} pixels in total", file=sys.stderr)
+
+
+def parse_char(s):
+    try:
+        char = int(s, 0)
+    except ValueError:
+        if len(s) != 1 or ord(s) > 127:
+            raise
+        char = ord(s)
+    if not 0 <= char < 256:
+        raise ValueError(f"Character code out of range: {s}")
+    return char
+
+
+def read_font(filename):
+    with open(filename, "rb") as f:
+        return Font(f.read())
+
+
+def load_index(paths):
+    """Returns a FontIndex of font files, directories, banks and indexes"""
+    if len(paths) == 1 and paths[0].endswith(".npz"):
+        return fontindex.FontIndex.load(paths[0])
+    names = []
+    fonts = []
+    for path in _expand(paths):
+        data = path.read_bytes()
+        if data.startswith(fontbank.MAGIC):
+            with fontbank.FontBank(path) as bank:
+                for name, font in bank.items():
+                    names.append(f"{path}:{name}")
+                    fonts.append(Font(bytes(font.data)))
+            continue
+        try:
+            fonts.append(Font(data))
+            names.append(str(path))
+        except ValueError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    return fontindex.FontIndex.from_fonts(names, fonts)
+
+
+def _expand(paths):
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.iterdir() if p.is_file())
+        else:
+            yield path
+
+
+if __name__ == "__main__":
+    main()
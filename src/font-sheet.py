@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+
+import numpy as np
+from PIL import Image
+
+from lib.font import Font
+
+# Glyph grid within each font's panel, same as image-to-font.py
+GRID_ROWS = 8
+GRID_COLS = 256 // GRID_ROWS
+
+# Pixels of empty space between panels
+GAP = 8
+
+# Palette indexes used in the sheet
+BG1, BG2, FG1, FG2, ADDED, REMOVED, LABEL, MARGIN = range(8)
+PALETTE = [
+    0x00, 0x00, 0x00,   # BG1
+    0x22, 0x22, 0x22,   # BG2
+    0xDD, 0xDD, 0xDD,   # FG1
+    0xFF, 0xFF, 0xFF,   # FG2
+    0xFF, 0x44, 0x44,   # ADDED: pixel set here, but not in the reference
+    0x33, 0x66, 0xFF,   # REMOVED: pixel set in the reference, but not here
+    0xFF, 0xCC, 0x44,   # LABEL
+    0x10, 0x10, 0x18,   # MARGIN
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render many DOS fonts side by side in one image"
+    )
+    parser.add_argument(
+        "fonts", type=str, nargs="+",
+        help="font files, or directories of font files")
+    parser.add_argument(
+        "--output", "-o", type=str, required=True,
+        help="name for the resulting image")
+    parser.add_argument(
+        "--columns", "-c", type=int, default=4,
+        help="number of fonts per row of the sheet")
+    parser.add_argument(
+        "--reference", "-r", type=str, metavar="FONT",
+        help="highlight pixels that differ from this font")
+    parser.add_argument(
+        "--no-labels", dest="labels", action="store_false",
+        help="don't label each font with its filename")
+    args = parser.parse_args(argv)
+
+    names, fonts = load_fonts(args.fonts)
+    if not fonts:
+        sys.exit("No fonts found")
+    reference = None
+    if args.reference:
+        with open(args.reference, "rb") as f:
+            reference = Font(f.read())
+    labels = names if args.labels else None
+
+    pixels = contact_sheet(fonts, labels, args.columns, reference)
+    result = Image.frombuffer(
+        "P", (pixels.shape[1], pixels.shape[0]), pixels, "raw", "P", 0, 1)
+    result.putpalette(PALETTE)
+    result.save(args.output)
+
+
+def load_fonts(paths):
+    """Returns (names, fonts) for the given font files and directories"""
+    files = []
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.is_file()))
+        else:
+            files.append(path)
+
+    names = []
+    fonts = []
+    for path in files:
+        try:
+            with open(path, "rb") as f:
+                fonts.append(Font(f.read()))
+            names.append(path.name)
+        except ValueError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    return names, fonts
+
+
+def contact_sheet(fonts, labels=None, columns=4, reference=None):
+    """Draws fonts in a grid of panels, returning a 2D array of color indexes.
+
+    Every panel is sized to fit the tallest font, and shorter fonts are drawn
+    at the top of their panels. If labels are given, each panel gets a title
+    drawn in the first font. If a reference font is given, pixels that differ
+    from it are drawn in the ADDED/REMOVED colors; glyphs of other heights are
+    compared with both glyphs aligned at the top, as in fontindex.diff().
+    """
+    columns = max(1, min(columns, len(fonts)))
+    max_height = max(font.height for font in fonts)
+    label_height = fonts[0].height + 2 if labels else 0
+    panel_width = GRID_COLS * 8
+    panel_height = label_height + GRID_ROWS * max_height
+    sheet_rows = -(-len(fonts) // columns)
+
+    # Allocate the whole sheet up front; every panel is drawn into it in place
+    width = columns * (panel_width + GAP) + GAP
+    height = sheet_rows * (panel_height + GAP) + GAP
+    sheet = np.full((height, width), MARGIN, dtype=np.uint8)
+
+    # Color lookup table: (checkerboard, bit, reference bit) -> color
+    colors = np.array([
+        [[BG1, REMOVED], [ADDED, FG1]],
+        [[BG2, REMOVED], [ADDED, FG2]],
+    ], dtype=np.uint8)
+    row, col = np.divmod(np.arange(256), GRID_COLS)
+    checkerboard = ((row & 1) ^ (col & 1))[:, np.newaxis, np.newaxis]
+
+    if labels:
+        label_glyphs = fonts[0].bitmaps()
+    if reference is not None:
+        ref_bitmaps = reference.bitmaps()
+    for i, font in enumerate(fonts):
+        bitmaps = font.bitmaps()
+        if reference is None:
+            ref_bits = bitmaps
+        else:
+            ref_bits = _align(ref_bitmaps, font.height)
+        atlas = colors[checkerboard, bitmaps, ref_bits]
+
+        # Lay out the glyphs in a grid, then copy them into the sheet
+        panel = atlas.reshape(GRID_ROWS, GRID_COLS, font.height, 8)
+        panel = panel.swapaxes(1, 2).reshape(GRID_ROWS * font.height, -1)
+        sheet_row, sheet_col = divmod(i, columns)
+        x = GAP + sheet_col * (panel_width + GAP)
+        y = GAP + sheet_row * (panel_height + GAP)
+        sheet[y + label_height:y + label_height + panel.shape[0],
+              x:x + panel_width] = panel
+
+        if labels:
+            _draw_text(sheet, x, y, labels[i], label_glyphs, GRID_COLS)
+
+    return sheet
+
+
+def _align(bitmaps, height):
+    """Crops or pads (256, h, 8) glyph bitmaps at the bottom to a height"""
+    diff = height - bitmaps.shape[1]
+    if diff >= 0:
+        return np.pad(bitmaps, ((0, 0), (0, diff), (0, 0)))
+    return bitmaps[:, :height]
+
+
+def _draw_text(sheet, x, y, text, glyphs, max_chars):
+    """Draws a line of text into the sheet, using (256, h, 8) glyph bitmaps"""
+    codes = text.encode("cp437", errors="replace")[:max_chars]
+    if not codes:
+        return
+    chars = glyphs[np.frombuffer(codes, dtype=np.uint8)]
+    line = chars.swapaxes(0, 1).reshape(glyphs.shape[1], -1)
+    region = sheet[y:y + line.shape[0], x:x + line.shape[1]]
+    region[line == 1] = LABEL
+
+
+if __name__ == "__main__":
+    main()
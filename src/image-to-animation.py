@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import sys
+import time
+
+from lib import animation, instrument
+from lib.font import Font
+from lib.palette import Palette
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="""
+            Convert a sequence of images to a text-mode animation. Only the
+            cells that change from one frame to the next are converted and
+            stored. See lib/animation.py for the file format.
+            """
+    )
+    parser.add_argument(
+        "inputs", type=str, nargs="+",
+        help="""
+            images to convert, in order: image files, multi-frame images
+            such as animated GIFs, or directories of numbered images
+            """
+    )
+    parser.add_argument("font", type=str, help="font file in DOS format")
+    parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    parser.add_argument(
+        "output", type=str, help='animation file to write, or "-" for stdout')
+    parser.add_argument(
+        "--cols", type=int, default=80, help="screen width in characters")
+    parser.add_argument(
+        "--rows", type=int, default=25, help="screen height in characters")
+    parser.add_argument(
+        "--no-blink", dest="blink", action="store_false",
+        help="allow all 16 background colors (blink bit disabled)")
+    parser.add_argument(
+        "--keyframe-interval", "-k", type=int, default=100,
+        help="most frames between keyframes (default: %(default)s)")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="number of conversion threads (default: one per CPU)")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with open(args.font, "rb") as f:
+        font = Font(f.read())
+    with open(args.palette, "rb") as f:
+        palette = Palette.from_bytes(f.read())
+
+    converter = animation.AnimationConverter(
+        font, palette, args.cols, args.rows, args.blink, args.jobs)
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if args.output == "-":
+            f = sys.stdout.buffer
+        else:
+            f = stack.enter_context(open(args.output, "wb"))
+        writer = animation.AnimationWriter(
+            f, args.cols, args.rows, args.blink, args.keyframe_interval)
+        images = animation.read_images(args.inputs)
+        for chars, attrs in converter.convert(images):
+            with instrument.stage("file.write"):
+                writer.write(chars, attrs)
+        f.flush()
+    elapsed = time.perf_counter() - start
+
+    frames = converter.frames
+    cells = frames*args.cols*args.rows
+    reused = 1 - converter.cells_converted/cells if cells else 0
+    print(f"Wrote {frames} frames ({writer.keyframes} keyframes, "
+          f"{writer.deltas} deltas) in {elapsed:.2f}s, "
+          f"{frames/elapsed:.1f} frames/s; {reused:.0%} of cells reused",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
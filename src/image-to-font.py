@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 import argparse
+import multiprocessing
+import pathlib
+import sys
+
+import numpy as np
 from PIL import Image, UnidentifiedImageError
 
+from lib import instrument
+from lib.font import Font
+
 
-def main():
+def main(argv=None):
     # Read args
     parser = argparse.ArgumentParser(
         description="Convert bitmap images to EGA fonts, and vice-versa"
@@ -13,29 +21,71 @@ def main():
     parser.add_argument(
         '--dim', '-d', action='store_true',
         help='generate a dimmed image, useful for creating a template')
-    args = parser.parse_args()
+    parser.add_argument(
+        '--batch', '-b', action='store_true',
+        help='treat input and output as directories, and convert every file')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='number of worker processes for --batch (default: one per CPU)')
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
 
     # Do the conversion
-    input_file = open_file(args.input)
-    if isinstance(input_file, Image.Image):
-        image_to_font(input_file, args.output)
+    if args.batch:
+        convert_dir(args.input, args.output, args.dim, args.jobs)
     else:
-        font_to_image(input_file, args.output, args.dim)
-
+        convert_file(args.input, args.output, args.dim)
 
-class Font:
-    def __init__(self, data):
-        if len(data) % 256 != 0:
-            raise ValueError('Font data not a multiple of 256')
-        height = len(data) // 256
-        if height < 1 or height > 32:
-            raise ValueError(f'Font height {height} out of range')
-        self.data = bytes(data)
-        self.height = height
-        self.width = 8
 
-    def char(self, i):
-        return self.data[i*self.height:(i + 1)*self.height]
+def convert_file(input_name, output_name, dim=False):
+    """Converts a font to an image, or an image to a font"""
+    with instrument.stage('file.read'):
+        input_file = open_file(input_name)
+    if isinstance(input_file, Image.Image):
+        image_to_font(input_file, output_name)
+    else:
+        font_to_image(input_file, output_name, dim)
+
+
+def convert_dir(input_dir, output_dir, dim=False, processes=None):
+    """Converts every font/image in a directory, using a pool of workers.
+
+    Images become fonts named after their height (e.g. "foo.png" becomes
+    "foo.f14"), and fonts become PNG images (e.g. "foo.f14" becomes
+    "foo.f14.png").
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (str(path), str(output_dir), dim)
+        for path in sorted(pathlib.Path(input_dir).iterdir())
+        if path.is_file()
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        for input_name, error in pool.imap_unordered(_convert_job, jobs):
+            if error:
+                print(f'{input_name}: {error}', file=sys.stderr)
+
+
+def _convert_job(job):
+    """Worker for convert_dir(). Returns (input_name, error or None)"""
+    input_name, output_dir, dim = job
+    try:
+        input_file = open_file(input_name)
+        path = pathlib.Path(input_name)
+        if isinstance(input_file, Image.Image):
+            font_data = image_to_font_data(input_file)
+            height = len(font_data) // 256
+            output_name = pathlib.Path(output_dir, f'{path.stem}.f{height}')
+            with open(output_name, 'wb') as f:
+                f.write(font_data)
+        else:
+            output_name = pathlib.Path(output_dir, f'{path.name}.png')
+            font_to_image(input_file, output_name, dim)
+    except (OSError, ValueError) as e:
+        return input_name, e
+    return input_name, None
 
 
 def open_file(filename):
@@ -49,6 +99,14 @@ def open_file(filename):
 
 def image_to_font(im: Image.Image, output_name: str):
     """Writes a font file derived from the given Image object"""
+    font_data = image_to_font_data(im)
+    with instrument.stage('file.write'):
+        with open(output_name, 'wb') as f:
+            f.write(font_data)
+
+
+def image_to_font_data(im: Image.Image) -> bytes:
+    """Returns font data derived from the given Image object"""
     # Figure out the font size and character grid
     num_pixels = im.width * im.height
     if num_pixels % (256 * 8) != 0 or im.width % 8 != 0:
@@ -58,28 +116,20 @@ def image_to_font(im: Image.Image, output_name: str):
     if font_height < 1 or font_height > 32:
         raise ValueError(f'Font height {font_height} out of range')
     cols = im.width // 8
+    rows = -(-256 // cols)
+
+    # Convert image to black-and-white, 1-bit color. Pad the bottom with
+    # black pixels in case the last row of the character grid is cut off.
+    with instrument.stage('image.decode'):
+        bits = np.zeros((rows * font_height, im.width), dtype=np.uint8)
+        bits[:im.height] = np.asarray(im.convert(mode='1'))
 
-    # Convert image to black-and-white, 1-bit color
-    bw = im.convert(mode='1')
-
-    # Read characters out of the image data
-    font_data = bytearray(256 * font_height)
-    for char_code in range(256):
-        row = char_code // cols
-        col = char_code % cols
-        x = col * font_width
-        y = row * font_height
-        char = bw.crop((x, y, x + font_width, y + font_height))
-        bits = [pixel//255 for pixel in char.getdata()]
-        for i in range(font_height):
-            byte = 0
-            for bit in bits[i*8:(i + 1)*8]:
-                byte = (byte << 1) | bit
-            font_data[char_code*font_height + i] = byte
-
-    # Write font to disk
-    with open(output_name, 'wb') as f:
-        f.write(font_data)
+    # Cut the image into a grid of characters, in reading order
+    with instrument.stage('font.pack'):
+        chars = bits.reshape(rows, font_height, cols, font_width)
+        chars = chars.swapaxes(1, 2)
+        chars = chars.reshape(rows * cols, font_height, font_width)[:256]
+        return np.packbits(chars, axis=-1).tobytes()
 
 
 def font_to_image(font: Font, output_name: str, dim=False):
@@ -88,35 +138,22 @@ def font_to_image(font: Font, output_name: str, dim=False):
     ROWS = 8
     COLS = 256 // ROWS
 
-    # Set up raw pixel data (1 byte per pixel, indexed)
+    # Color each grid cell with a checkerboard pattern
+    row, col = np.divmod(np.arange(256), COLS)
+    checkerboard = (row & 1) ^ (col & 1)
+    fg = (checkerboard + 2)[:, np.newaxis, np.newaxis]
+    bg = checkerboard[:, np.newaxis, np.newaxis]
+    with instrument.stage('image.render'):
+        pixels = np.where(font.bitmaps(), fg, bg).astype(np.uint8)
+
+        # Lay out the characters in the grid
+        pixels = pixels.reshape(ROWS, COLS, font.height, font.width)
+        pixels = pixels.swapaxes(1, 2).tobytes()
     width = COLS * font.width
     height = ROWS * font.height
-    pixels = bytearray(width * height)
-
-    # Write font characters, one character per grid cell
-    for i in range(256):
-        # Find position in grid
-        row = i // COLS
-        col = i % COLS
-
-        # Find pixel offset of the grid cell's top-left corner
-        x = col * font.width
-        y = row * font.height
-        top_left_offset = y * width + x
-
-        # Write character
-        checkerboard = (row & 1) ^ (col & 1)
-        fg = checkerboard + 2
-        bg = checkerboard
-        offset = top_left_offset
-        for scanline in font.char(i):
-            bits = [(scanline >> i) & 1 for i in range(7, -1, -1)]
-            colors = [[bg, fg][bit] for bit in bits]
-            pixels[offset: offset + 8] = colors
-            offset += width
 
     # Create image with palette
-    result = Image.frombytes('P', (width, height), bytes(pixels))
+    result = Image.frombytes('P', (width, height), pixels)
     BG1 = [0x00, 0x00, 0x00]
     BG2 = [0x22, 0x22, 0x22]
     FG1 = [0xDD, 0xDD, 0xDD]
@@ -128,7 +165,9 @@ def font_to_image(font: Font, output_name: str, dim=False):
     result.putpalette(palette)
 
     # Save image
-    result.save(output_name)
+    with instrument.stage('image.encode'):
+        result.save(output_name)
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import argparse
+
+from PIL import Image
+
+from lib.font import Font
+from lib.palette import Palette
+from lib import textmode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert an image to a text-mode screen"
+    )
+    parser.add_argument("input", type=str, help="image file to convert")
+    parser.add_argument("font", type=str, help="font file in DOS format")
+    parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    parser.add_argument(
+        "output", type=str,
+        help="name for the screen buffer (2 bytes/cell: char, attribute)")
+    parser.add_argument(
+        "--preview", "-p", type=str, metavar="IMAGE",
+        help="also write a rendered preview of the screen")
+    parser.add_argument(
+        "--cols", type=int, default=80, help="screen width in characters")
+    parser.add_argument(
+        "--rows", type=int, default=25, help="screen height in characters")
+    parser.add_argument(
+        "--no-blink", dest="blink", action="store_false",
+        help="allow all 16 background colors (blink bit disabled)")
+    args = parser.parse_args(argv)
+
+    with open(args.font, "rb") as f:
+        font = Font(f.read())
+    with open(args.palette, "rb") as f:
+        palette = Palette.from_bytes(f.read())
+
+    with Image.open(args.input) as im:
+        chars, attrs = textmode.convert(
+            im, font, palette, args.cols, args.rows, args.blink)
+
+    with open(args.output, "wb") as f:
+        f.write(textmode.to_bytes(chars, attrs))
+    if args.preview:
+        preview = textmode.render(chars, attrs, font, palette, args.blink)
+        preview.save(args.preview)
+
+
+if __name__ == "__main__":
+    main()
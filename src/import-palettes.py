@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import multiprocessing
+import pathlib
+import sys
+import tarfile
+import time
+
+from lib.palette import Palette, detect_format, parse_colors
+
+# Files read ahead of the workers at a time. Pool.imap() would otherwise
+# read every input into memory before the first result comes back.
+BATCH_SIZE = 4096
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert many text-based palettes to VGA format at once"
+    )
+    parser.add_argument(
+        "inputs", type=str, nargs="+",
+        help="palette files, directories, or tarballs of palette files")
+    parser.add_argument(
+        "--output", "-o", type=str, required=True,
+        help="""results file: one line per palette, holding the VGA palette
+            as 96 hex digits, then a tab, then the palette's name""")
+    parser.add_argument(
+        "--errors", "-e", type=str,
+        help="""error report: one line per rejected file, holding its name,
+            then a tab, then the reason (default: stderr)""")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    num_ok = num_errors = 0
+    error_file = open(args.errors, "w") if args.errors else sys.stderr
+    try:
+        with open(args.output, "w") as out, \
+                multiprocessing.Pool(args.jobs) as pool:
+            inputs = read_inputs(args.inputs)
+            while batch := list(itertools.islice(inputs, BATCH_SIZE)):
+                for name, data, error in pool.imap(
+                        import_palette, batch, 64):
+                    if error:
+                        print(f"{name}\t{error}", file=error_file)
+                        num_errors += 1
+                    else:
+                        print(f"{data.hex()}\t{name}", file=out)
+                        num_ok += 1
+    finally:
+        if error_file is not sys.stderr:
+            error_file.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Imported {num_ok} palettes ({num_errors} rejected) in "
+        f"{elapsed:.2f}s ({(num_ok + num_errors)/elapsed:.0f} files/sec)",
+        file=sys.stderr)
+
+
+def read_inputs(inputs):
+    """Yields (name, contents) for every file in the given inputs"""
+    for path in map(pathlib.Path, inputs):
+        if path.is_dir():
+            for child in sorted(path.rglob("*")):
+                if child.is_file():
+                    yield str(child), child.read_bytes()
+        elif tarfile.is_tarfile(path):
+            # Stream the archive, rather than reading its whole index first
+            with tarfile.open(path, "r|*") as tar:
+                for member in tar:
+                    if member.isfile():
+                        yield member.name, tar.extractfile(member).read()
+        else:
+            yield str(path), path.read_bytes()
+
+
+def import_palette(item):
+    """Worker: parses one palette, returning (name, VGA bytes, error)"""
+    name, contents = item
+    text = contents.decode("utf-8", errors="replace")
+    colors = parse_colors(text, detect_format(text))
+    if len(colors) != 16:
+        return name, None, f"Found {len(colors)} colors, expected 16"
+    return name, bytes(Palette(colors)), None
+
+
+if __name__ == "__main__":
+    main()
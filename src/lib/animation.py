@@ -0,0 +1,297 @@
+"""Text-mode animations: sequences of screens, stored as changes.
+
+An animation file starts with a header: the magic bytes, then the screen's
+columns and rows as little-endian uint16s, then a flags byte (bit 0: the
+blink bit is enabled). Each frame follows as one record:
+
+- Keyframe: b"K", then the whole screen in B800 format (char, attr pairs)
+- Delta: b"D", a uint32 count, then that many cells that differ from the
+  previous frame, each as a uint16 cell index, a char and an attr
+
+Consecutive frames of a video are mostly identical, so AnimationConverter
+only converts the cells whose source pixels changed since the last frame,
+and reuses the last frame's choices for the rest.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import os
+import pathlib
+import queue
+import re
+import struct
+import threading
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from . import instrument, textmode
+
+MAGIC = b"TMA1"
+HEADER = struct.Struct("<4sHHB")
+FLAG_BLINK = 0x01
+
+KEYFRAME = b"K"
+DELTA = b"D"
+COUNT = struct.Struct("<I")
+DELTA_CELL = np.dtype([("index", "<u2"), ("char", "u1"), ("attr", "u1")])
+
+# Delta records can only address this many cells
+MAX_CELLS = 1 << 16
+
+# Seconds between checks for a stopped consumer, in background threads
+_POLL_INTERVAL = 0.1
+
+
+class AnimationConverter:
+    """Converts a sequence of images to text-mode screens.
+
+    Work is split into overlapping stages: one thread decodes and resizes
+    frames, a pool of threads converts the cells that changed, and the
+    caller consumes the finished screens in order. Each stage only runs a
+    few frames ahead of the next, so memory use stays bounded no matter how
+    long the sequence is. With a single worker, everything runs on the
+    calling thread instead.
+
+    These are threads, not processes, so nothing needs to be pickled, and
+    conversion works the same under any multiprocessing start method.
+    """
+
+    def __init__(self, font, palette, cols=80, rows=25, blink=True,
+                 workers=None):
+        self.font = font
+        self.palette = palette
+        self.cols = cols
+        self.rows = rows
+        self.blink = blink
+        self.workers = workers or os.cpu_count() or 1
+
+        # Totals for the frames converted so far
+        self.frames = 0
+        self.cells_converted = 0
+
+    def convert(self, images):
+        """Yields a (chars, attrs) pair of (rows, cols) arrays per image"""
+        if self.workers == 1:
+            yield from self._convert_serial(images)
+            return
+        backlog = 2*self.workers
+        decoded = _in_background(
+            (self._decode(im) for im in images), backlog)
+        pending = collections.deque()
+        chars = attrs = None
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool, \
+                contextlib.closing(decoded):
+            last_cells = None
+            for cells in decoded:
+                changed = _changed_cells(cells, last_cells)
+                last_cells = cells
+                pending.append(
+                    (changed, pool.submit(self._convert, cells[changed])))
+
+                if len(pending) > backlog:
+                    changed, future = pending.popleft()
+                    chars, attrs = self._apply(
+                        changed, future.result(), chars, attrs)
+                    yield self._screen(chars, attrs)
+            while pending:
+                changed, future = pending.popleft()
+                chars, attrs = self._apply(
+                    changed, future.result(), chars, attrs)
+                yield self._screen(chars, attrs)
+
+    def _convert_serial(self, images):
+        """Does the work of convert() on the calling thread alone"""
+        chars = attrs = last_cells = None
+        for im in images:
+            cells = self._decode(im)
+            changed = _changed_cells(cells, last_cells)
+            last_cells = cells
+            chars, attrs = self._apply(
+                changed, self._convert(cells[changed]), chars, attrs)
+            yield self._screen(chars, attrs)
+
+    def _decode(self, im):
+        with instrument.stage("image.decode"):
+            pixels = textmode.fit(im, self.font, self.cols, self.rows)
+            return textmode.split_cells(pixels, self.font.height)
+
+    def _convert(self, cells):
+        with instrument.stage("textmode.convert"):
+            return textmode.convert_cells(
+                cells, self.font, self.palette, self.blink)
+
+    def _apply(self, changed, converted, chars, attrs):
+        """Updates the last screen with the cells that were converted"""
+        new_chars, new_attrs = converted
+        if chars is None:
+            chars, attrs = new_chars, new_attrs
+        else:
+            chars = chars.copy()
+            attrs = attrs.copy()
+            chars[changed] = new_chars
+            attrs[changed] = new_attrs
+        self.frames += 1
+        self.cells_converted += len(changed)
+        return chars, attrs
+
+    def _screen(self, chars, attrs):
+        shape = (self.rows, self.cols)
+        return chars.reshape(shape), attrs.reshape(shape)
+
+
+class AnimationWriter:
+    """Writes screens to an animation file, as keyframes or deltas.
+
+    A keyframe is written for the first frame, then at least every
+    keyframe_interval frames so that playback can start partway through, and
+    whenever a delta would be no smaller than a keyframe.
+    """
+
+    def __init__(self, f, cols=80, rows=25, blink=True,
+                 keyframe_interval=100):
+        if cols*rows > MAX_CELLS:
+            raise ValueError(f"Animations can have at most {MAX_CELLS} cells")
+        self.f = f
+        self.keyframe_interval = keyframe_interval
+        self.last = None
+        self.since_keyframe = 0
+        self.keyframes = 0
+        self.deltas = 0
+        flags = FLAG_BLINK if blink else 0
+        f.write(HEADER.pack(MAGIC, cols, rows, flags))
+
+    def write(self, chars, attrs):
+        cells = np.stack([chars, attrs], axis=-1).reshape(-1, 2)
+        changed = None
+        if self.last is not None and self.since_keyframe < (
+                self.keyframe_interval):
+            changed = np.nonzero(np.any(cells != self.last, axis=1))[0]
+            if len(changed)*DELTA_CELL.itemsize >= cells.size:
+                changed = None
+
+        if changed is None:
+            self.f.write(KEYFRAME + cells.astype(np.uint8).tobytes())
+            self.keyframes += 1
+            self.since_keyframe = 1
+        else:
+            records = np.empty(len(changed), dtype=DELTA_CELL)
+            records["index"] = changed
+            records["char"] = cells[changed, 0]
+            records["attr"] = cells[changed, 1]
+            self.f.write(DELTA + COUNT.pack(len(changed)) + records.tobytes())
+            self.deltas += 1
+            self.since_keyframe += 1
+        self.last = cells
+
+
+def read_animation(f):
+    """Reads an animation file's header.
+
+    Returns (cols, rows, blink, frames), where frames yields a (chars,
+    attrs) pair of (rows, cols) arrays for each frame in the file.
+    """
+    magic, cols, rows, flags = HEADER.unpack(_read_exactly(f, HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a text-mode animation file")
+    return cols, rows, bool(flags & FLAG_BLINK), _read_frames(f, cols, rows)
+
+
+def _read_frames(f, cols, rows):
+    cells = None
+    while kind := f.read(1):
+        if kind == KEYFRAME:
+            data = _read_exactly(f, cols*rows*2)
+            cells = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2).copy()
+        elif kind == DELTA and cells is not None:
+            count, = COUNT.unpack(_read_exactly(f, COUNT.size))
+            data = _read_exactly(f, count*DELTA_CELL.itemsize)
+            records = np.frombuffer(data, dtype=DELTA_CELL)
+            cells = cells.copy()
+            cells[records["index"], 0] = records["char"]
+            cells[records["index"], 1] = records["attr"]
+        else:
+            raise ValueError(f"Unexpected record type {kind!r}")
+        yield cells[:, 0].reshape(rows, cols), cells[:, 1].reshape(rows, cols)
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Animation file is truncated")
+    return data
+
+
+def read_images(paths):
+    """Yields the frames of a sequence of images.
+
+    Each path can be an image, a multi-frame image (e.g. an animated GIF),
+    or a directory of images, which are read in natural order: frame2.png
+    comes before frame10.png.
+    """
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            files = sorted((p for p in path.iterdir() if p.is_file()),
+                           key=_natural_key)
+            yield from read_images(files)
+            continue
+        with Image.open(path) as im:
+            yield from ImageSequence.Iterator(im)
+
+
+def _changed_cells(cells, last_cells):
+    """Returns the indexes of the cells that differ from the last frame's"""
+    if last_cells is None:
+        return np.arange(len(cells))
+    return np.nonzero(np.any(cells != last_cells, axis=(1, 2)))[0]
+
+
+def _natural_key(path):
+    parts = re.split(r"(\d+)", path.name)
+    return [int(x) if x.isdigit() else x for x in parts]
+
+
+def _in_background(iterable, maxsize):
+    """Runs an iterator on another thread, staying at most maxsize ahead.
+
+    If the caller stops early, closing the generator (or dropping it) tells
+    the thread to stop too, instead of leaving it blocked on a full queue.
+    """
+    results = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(entry):
+        # Time out now and then to check whether the caller is gone
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except BaseException as e:
+            put((False, e))
+        else:
+            put((False, None))
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            ok, item = results.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+__all__ = ["MAGIC", "MAX_CELLS", "AnimationConverter", "AnimationWriter",
+           "read_animation", "read_images"]
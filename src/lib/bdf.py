@@ -0,0 +1,166 @@
+import collections
+import contextlib
+import hashlib
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+
+from . import instrument
+
+# Bump this whenever the cache file layout or the decoding logic changes
+CACHE_VERSION = 1
+
+Glyph = collections.namedtuple("Glyph", "codepoint bbx hexdata")
+
+
+class GlyphIndex:
+    """Every glyph in a BDF font, drawn into the font's bounding box.
+
+    bitmaps is a (num_glyphs, height, width) array of 0s and 1s, and
+    codepoints holds the Unicode codepoint of each glyph.
+    """
+
+    def __init__(self, codepoints, bitmaps):
+        self.codepoints = np.asarray(codepoints, dtype=np.int64)
+        self.bitmaps = np.asarray(bitmaps, dtype=np.uint8)
+        self.index = {int(cp): i for i, cp in enumerate(self.codepoints)}
+
+    def __contains__(self, codepoint):
+        return codepoint in self.index
+
+    def get(self, codepoint):
+        """Returns the bitmap for the given codepoint, or None"""
+        i = self.index.get(codepoint)
+        return None if i is None else self.bitmaps[i]
+
+
+def load(filename, cache_dir=None) -> GlyphIndex:
+    """Reads a BDF file into a GlyphIndex.
+
+    If cache_dir is given, decoded glyphs are stored there, keyed by a hash of
+    the file's contents, so later loads of the same font skip parsing. If
+    the cache can't be written, the glyphs are still returned.
+    """
+    with instrument.stage("bdf.read"):
+        with open(filename, "rb") as f:
+            data = f.read()
+    if cache_dir is None:
+        return _decode(data)
+
+    with instrument.stage("bdf.cache"):
+        digest = hashlib.sha256(data).hexdigest()
+        cache_file = pathlib.Path(
+            cache_dir, f"bdf-v{CACHE_VERSION}-{digest}.npz")
+        try:
+            with np.load(cache_file) as cached:
+                return GlyphIndex(cached["codepoints"], cached["bitmaps"])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    glyphs = _decode(data)
+    with instrument.stage("bdf.cache"):
+        # Caching is only an optimization, so failing to write is fine
+        tmp_name = None
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(
+                dir=cache_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f, codepoints=glyphs.codepoints, bitmaps=glyphs.bitmaps)
+            os.replace(tmp_name, cache_file)
+        except OSError:
+            if tmp_name is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_name)
+    return glyphs
+
+
+def parse(text: str):
+    """Parses BDF text, returning (bounding_box, glyphs).
+
+    bounding_box is the font's (width, height, xoff, yoff), and glyphs is a
+    list of Glyph tuples. Glyphs without an encoding are skipped.
+    """
+    bounding_box = None
+    glyphs = []
+    codepoint = bbx = None
+    hexdata = None
+    for line in text.splitlines():
+        if hexdata is not None:
+            if line.startswith("ENDCHAR"):
+                if codepoint is not None and codepoint >= 0:
+                    glyphs.append(Glyph(codepoint, bbx, hexdata))
+                hexdata = None
+            else:
+                hexdata.append(line.strip())
+            continue
+
+        keyword, _, rest = line.partition(" ")
+        if keyword == "FONTBOUNDINGBOX":
+            bounding_box = tuple(int(x) for x in rest.split())
+        elif keyword == "STARTCHAR":
+            codepoint = bbx = None
+        elif keyword == "ENCODING":
+            codepoint = int(rest.split()[0])
+        elif keyword == "BBX":
+            bbx = tuple(int(x) for x in rest.split())
+        elif keyword == "BITMAP":
+            hexdata = []
+
+    if bounding_box is None:
+        raise ValueError("BDF font has no FONTBOUNDINGBOX")
+    return bounding_box, glyphs
+
+
+def draw(glyph: Glyph, bounding_box) -> np.ndarray:
+    """Draws a glyph into the font's bounding box, as a 2D array of 0s and 1s.
+
+    The glyph's rows are decoded straight from its hex data, and positioned
+    using its BBX offsets relative to the font's bounding box.
+    """
+    fbb_width, fbb_height, fbb_xoff, fbb_yoff = bounding_box
+    width, height, xoff, yoff = glyph.bbx
+    if len(glyph.hexdata) != height:
+        raise ValueError(
+            f"Glyph for codepoint {glyph.codepoint} has {len(glyph.hexdata)} "
+            f"rows of bitmap data, but its BBX height is {height}"
+        )
+
+    # Decode hex rows into a (height, width) array of bits
+    row_len = max((len(h) for h in glyph.hexdata), default=0)
+    row_len += row_len % 2
+    rows = b"".join(bytes.fromhex(h.ljust(row_len, "0"))
+                    for h in glyph.hexdata)
+    bits = np.unpackbits(np.frombuffer(rows, dtype=np.uint8))
+    bits = bits.reshape(height, row_len*4)[:, :width]
+
+    # Copy the bits into place within the bounding box
+    result = np.zeros((fbb_height, fbb_width), dtype=np.uint8)
+    x = xoff - fbb_xoff
+    y = fbb_height - height - (yoff - fbb_yoff)
+    src_x, src_y = max(0, -x), max(0, -y)
+    dst_x, dst_y = max(0, x), max(0, y)
+    w = min(bits.shape[1] - src_x, fbb_width - dst_x)
+    h = min(height - src_y, fbb_height - dst_y)
+    if w > 0 and h > 0:
+        result[dst_y:dst_y + h, dst_x:dst_x + w] = \
+            bits[src_y:src_y + h, src_x:src_x + w]
+    return result
+
+
+def _decode(data: bytes) -> GlyphIndex:
+    with instrument.stage("bdf.parse"):
+        bounding_box, glyphs = parse(data.decode("latin-1"))
+    with instrument.stage("bdf.draw"):
+        fbb_width, fbb_height, _, _ = bounding_box
+        bitmaps = np.zeros(
+            (len(glyphs), fbb_height, fbb_width), dtype=np.uint8)
+        for i, glyph in enumerate(glyphs):
+            bitmaps[i] = draw(glyph, bounding_box)
+    return GlyphIndex([g.codepoint for g in glyphs], bitmaps)
+
+
+__all__ = ["Glyph", "GlyphIndex", "load", "parse", "draw"]
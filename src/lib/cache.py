@@ -0,0 +1,11 @@
+import os
+import pathlib
+
+
+def default_cache_dir():
+    """Returns the per-user cache directory for this repo's tools"""
+    base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base, "text-mode-experiments")
+
+
+__all__ = ["default_cache_dir"]
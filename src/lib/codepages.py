@@ -0,0 +1,157 @@
+"""Mappings between DOS codepages and Unicode, for picking font glyphs.
+
+Each codepage maps its 256 character codes to Unicode codepoints. Codes
+0-31 and 127 are the control characters, which DOS fonts draw as symbols
+(smileys, arrows, etc.) in every codepage; the rest come from Python's
+codecs.
+
+A font may not have a glyph for a character's exact codepoint, so each code
+also has a chain of candidate codepoints to fall back on, in order of
+preference: e.g. U+03B2 (Greek beta) for CP437's U+00DF (German eszett),
+which DOS fonts traditionally draw the same way.
+"""
+import collections
+
+# Glyphs that DOS fonts draw for control characters 0-31
+CONTROL_GLYPHS = " ☺☻♥♦♣♠•◘○◙♂♀♪♫☼►◄↕‼¶§▬↨↑↓→←∟↔▲▼"
+
+# Glyph that DOS fonts draw for character 127
+DELETE_GLYPH = "⌂"
+
+# What Python's codecs decode a codepage's unassigned character codes to
+UNDEFINED = "\ufffd"
+
+# Codepages that can be looked up by name
+NAMES = [
+    "cp437", "cp737", "cp775", "cp850", "cp852", "cp855", "cp857", "cp860",
+    "cp861", "cp862", "cp863", "cp865", "cp866", "cp869",
+]
+
+# Characters where a codepage's glyphs differ from Python's codec. CP437's
+# math symbols were often used for (and drawn like) these codepoints.
+OVERRIDES = {
+    "cp437": {0xE9: "ϴ", 0xED: "∅", 0xEE: "∈"},
+}
+
+# Characters that look alike, to use when a font lacks a character's glyph.
+# Each character maps to its alternatives, in order of preference.
+FALLBACKS = {
+    "ß": "β", "β": "ß",
+    "µ": "μ", "μ": "µ",
+    "Ω": "\u2126", "\u2126": "Ω",
+    "ϴ": "Θθ", "Θ": "ϴθ",
+    "∅": "φϕØø", "φ": "ϕ∅",
+    "∈": "εϵ", "ε": "ϵ∈",
+    "∙": "·•", "·": "∙",
+    "■": "▪",
+    "\u00a0": " ",
+    "‗": "_", "ı": "i",
+    "Ё": "Ë", "ё": "ë",
+    # Greek and Cyrillic letters shaped like Latin ones
+    "Α": "A", "Β": "B", "Ε": "E", "Ζ": "Z", "Η": "H", "Ι": "I", "Κ": "K",
+    "Μ": "M", "Ν": "N", "Ο": "O", "Ρ": "P", "Τ": "T", "Υ": "Y", "Χ": "X",
+    "ο": "o",
+    "А": "A", "В": "B", "Е": "E", "К": "K", "М": "M", "Н": "H", "О": "O",
+    "Р": "P", "С": "C", "Т": "T", "Х": "X", "а": "a", "е": "e", "о": "o",
+    "р": "p", "с": "c", "у": "y", "х": "x",
+}
+
+# A codepage's codepoint for each character code (None if unassigned), each
+# character's chain of candidate codepoints, and a reverse table from
+# codepoint to character code. The reverse table prefers each character's
+# own codepoint, then accepts its fallbacks.
+Codepage = collections.namedtuple(
+    "Codepage", "name codepoints candidates reverse")
+
+
+def _build(name):
+    decoded = bytes(range(256)).decode(name, errors="replace")
+    chars = list(CONTROL_GLYPHS + decoded[32:127] + DELETE_GLYPH
+                 + decoded[128:])
+    for code, char in OVERRIDES.get(name, {}).items():
+        chars[code] = char
+
+    candidates = []
+    for code, char in enumerate(chars):
+        if char == UNDEFINED:
+            candidates.append(())
+            continue
+        # The codec's own codepoint is a fallback for overridden characters
+        chain = [char]
+        if 32 <= code != 127:
+            chain.append(decoded[code])
+        chain += FALLBACKS.get(char, "")
+        candidates.append(tuple(dict.fromkeys(map(ord, chain))))
+    reverse = {}
+    for depth in range(max(map(len, candidates))):
+        for code, chain in enumerate(candidates):
+            if depth < len(chain):
+                reverse.setdefault(chain[depth], code)
+    codepoints = tuple(None if c == UNDEFINED else ord(c) for c in chars)
+    return Codepage(name, codepoints, tuple(candidates), reverse)
+
+
+CODEPAGES = {name: _build(name) for name in NAMES}
+
+
+def get(name) -> Codepage:
+    """Looks up a codepage by name, e.g. "cp437" or "CP850" """
+    try:
+        return CODEPAGES[name.lower()]
+    except KeyError:
+        raise ValueError(
+            f'Unknown codepage "{name}" (known: {", ".join(NAMES)})'
+        ) from None
+
+
+def code_for(codepage: Codepage, codepoint):
+    """Returns the character code that draws a codepoint, or None.
+
+    A character whose own codepoint it is wins over one that only has it as
+    a fallback. Fallbacks still count, e.g. U+03B2 (Greek beta) is CP437's
+    0xE1, the German eszett that DOS fonts draw the same way.
+    """
+    return codepage.reverse.get(codepoint)
+
+
+def select(codepage: Codepage, available):
+    """Picks a codepoint for each character from the available ones.
+
+    available is a set (or any container) of codepoints, e.g. those a font
+    has glyphs for. Returns a list of 256 codepoints, with None for
+    characters that have no available candidates, or that are unassigned.
+    """
+    result = []
+    for chain in codepage.candidates:
+        for codepoint in chain:
+            if codepoint in available:
+                result.append(codepoint)
+                break
+        else:
+            result.append(None)
+    return result
+
+
+def coverage(codepages, available):
+    """Finds the characters of each codepage with no available glyph.
+
+    The available codepoints are narrowed down to the candidates of all the
+    given codepages in one pass, so checking many codepages against a large
+    font is cheap. Returns {name: [missing character codes]}. Unassigned
+    characters are never missing.
+    """
+    wanted = set()
+    for codepage in codepages:
+        for chain in codepage.candidates:
+            wanted.update(chain)
+    present = wanted.intersection(available)
+    return {
+        codepage.name: [code for code, codepoint
+                        in enumerate(select(codepage, present))
+                        if codepoint is None and codepage.candidates[code]]
+        for codepage in codepages
+    }
+
+
+__all__ = ["CONTROL_GLYPHS", "NAMES", "FALLBACKS", "Codepage", "CODEPAGES",
+           "get", "code_for", "select", "coverage"]
@@ -0,0 +1,213 @@
+import numpy as np
+from PIL import Image
+
+from . import oklab
+from .palette import Palette, hybrid_distance
+from .quantize import STRIP_ROWS, palette_bytes
+
+# Error diffusion kernels, as (dx, dy, weight) for a left-to-right scan
+KERNELS = {
+    "floyd-steinberg": (
+        (1, 0, 7/16), (-1, 1, 3/16), (0, 1, 5/16), (1, 1, 1/16),
+    ),
+    "atkinson": (
+        (1, 0, 1/8), (2, 0, 1/8),
+        (-1, 1, 1/8), (0, 1, 1/8), (1, 1, 1/8),
+        (0, 2, 1/8),
+    ),
+}
+
+# All dithering methods: the error diffusion kernels, plus ordered dithering
+METHODS = [*KERNELS, "bayer"]
+
+# How far any kernel spreads error sideways and downward
+_PAD = 2
+_DEPTH = 2
+
+# Pixels to match against the palette at a time, for ordered dithering
+_CHUNK_PIXELS = 1 << 14
+
+
+def dither(im: Image.Image, palette, **kwargs) -> np.ndarray:
+    """Dither an image onto a palette, returning a 2D array of color indexes.
+
+    Takes the same keyword arguments as dither_strips().
+    """
+    result = np.empty((im.height, im.width), dtype=np.uint8)
+    y = 0
+    for strip in dither_strips(im, palette, **kwargs):
+        result[y:y + len(strip)] = strip
+        y += len(strip)
+    return result
+
+
+def dither_image(im: Image.Image, palette, **kwargs) -> Image.Image:
+    """Dither an image onto a palette, returning a "P" mode image."""
+    result = Image.fromarray(dither(im, palette, **kwargs), mode="P")
+    result.putpalette(palette_bytes(palette))
+    return result
+
+
+def dither_strips(im: Image.Image, palette, method="floyd-steinberg",
+                  serpentine=False, vga=False, spread=None,
+                  strip_rows=STRIP_ROWS):
+    """Dither an image onto a palette, yielding strips of color indexes.
+
+    The image is converted strip_rows rows at a time, and each strip is
+    yielded as a 2D array as soon as it's done, so memory use is bounded by
+    the strip size rather than the image size. Error that diffuses past the
+    bottom of a strip is carried over into the next one.
+
+    Colors are compared, and errors accumulated, in OKLAB space, using the
+    same hybrid distance formula as Palette.reorder().
+
+    method is one of METHODS. The error diffusion methods are sequential by
+    nature, but each pixel only receives error from pixels above it or to
+    its left. So the pixels on each diagonal x + 2*y == t can be processed
+    together, in one vectorized step per diagonal.
+
+    serpentine alternates the scan direction on every row. Each pixel then
+    depends on the one before it in scan order, so pixels can't be
+    processed in parallel: only the error passed down to the next rows is
+    vectorized, and this is much slower. It has no effect on ordered
+    dithering.
+
+    vga rounds the palette's colors to 6-bit VGA values (as written by
+    bytes(palette)) before matching, so errors are measured against the
+    colors that will actually be displayed.
+
+    spread sets the strength of ordered dithering, in OKLAB units. By
+    default, it's the average distance between each palette color and its
+    nearest neighbor.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown dithering method: {method}")
+    if vga:
+        palette = Palette.from_bytes(bytes(palette))
+    lab_palette = palette.lab
+    strips = _lab_strips(im, strip_rows)
+    if method == "bayer":
+        if spread is None:
+            spread = _default_spread(lab_palette)
+        return (_ordered(lab, y, lab_palette, spread) for y, lab in strips)
+    return _diffuse_strips(strips, im.width, lab_palette, KERNELS[method],
+                           serpentine)
+
+
+def bayer_matrix(size=8) -> np.ndarray:
+    """Return a size x size Bayer threshold matrix, with values in [0, 1).
+
+    size must be a power of 2.
+    """
+    m = np.zeros((1, 1))
+    while len(m) < size:
+        m = np.block([[4*m, 4*m + 2], [4*m + 3, 4*m + 1]])
+    return m / m.size
+
+
+def _lab_strips(im, strip_rows):
+    """Yields (y, OKLAB pixels) for each strip of rows in an image"""
+    for y in range(0, im.height, strip_rows):
+        y_end = min(y + strip_rows, im.height)
+        strip = im.crop((0, y, im.width, y_end)).convert("RGB")
+        yield y, oklab.to_oklab_array(np.asarray(strip))
+
+
+def _diffuse_strips(strips, width, lab_palette, kernel, serpentine):
+    # Error diffused into the rows just below the last strip
+    carry = np.zeros((_DEPTH, width + 2*_PAD, 3))
+    for y, lab in strips:
+        # Accumulated error, padded so that kernels can spill past the edges
+        err = np.zeros((len(lab) + _DEPTH, width + 2*_PAD, 3))
+        err[:_DEPTH] = carry
+        if serpentine:
+            yield _diffuse_serpentine(lab, err, lab_palette, kernel, y % 2)
+        else:
+            yield _diffuse_wavefront(lab, err, lab_palette, kernel)
+        carry = err[len(lab):]
+
+
+def _diffuse_wavefront(lab, err, lab_palette, kernel):
+    """Diffuses error over a strip, one diagonal of pixels at a time"""
+    height, width = lab.shape[:2]
+    result = np.empty((height, width), dtype=np.uint8)
+    rows = np.arange(height)
+    for t in range(width + 2*(height - 1)):
+        # Pixels with x + 2*y == t only receive error from smaller t
+        ys = rows[max(0, (t - width)//2 + 1):t//2 + 1]
+        xs = t - 2*ys
+        values = lab[ys, xs] + err[ys, xs + _PAD]
+        dists = hybrid_distance(values[:, np.newaxis], lab_palette)
+        indexes = np.argmin(dists, axis=1)
+        result[ys, xs] = indexes
+        error = values - lab_palette[indexes]
+        for dx, dy, weight in kernel:
+            err[ys + dy, xs + dx + _PAD] += error * weight
+    return result
+
+
+def _diffuse_serpentine(lab, err, lab_palette, kernel, parity):
+    """Diffuses error over a strip, alternating direction every row.
+
+    Unlike the raster scan, this can't be done a diagonal at a time: each
+    pixel needs the error from the one before it in its row, and a row's
+    first pixel needs the error from the last pixel of the row above. So
+    only the error passed along the row is diffused pixel by pixel. The
+    error passed down to the rows below is diffused a whole row at a time,
+    once the row is done.
+    """
+    height, width = lab.shape[:2]
+    result = np.empty((height, width), dtype=np.uint8)
+    along = [(dx, weight) for dx, dy, weight in kernel if dy == 0]
+    # Largest dx first, so that each pixel below receives its errors in the
+    # same order as when they were diffused pixel by pixel
+    down = sorted((k for k in kernel if k[1] > 0), key=lambda k: -k[0])
+    xs = np.arange(width) + _PAD
+    errors = np.empty((width, 3))
+    for y in range(height):
+        step = -1 if (y + parity) % 2 else 1
+        row_err = err[y]
+        for x in range(width)[::step]:
+            value = lab[y, x] + row_err[x + _PAD]
+            index = np.argmin(hybrid_distance(value, lab_palette))
+            result[y, x] = index
+            error = value - lab_palette[index]
+            errors[x] = error
+            for dx, weight in along:
+                row_err[x + step*dx + _PAD] += error * weight
+        for dx, dy, weight in down:
+            err[y + dy, xs + step*dx] += errors * weight
+    return result
+
+
+def _ordered(lab, y, lab_palette, spread):
+    """Applies ordered dithering to a strip that starts at row y"""
+    height, width = lab.shape[:2]
+    thresholds = bayer_matrix() - 0.5
+    rows = (np.arange(height) + y) % len(thresholds)
+    cols = np.arange(width) % len(thresholds)
+
+    # Nudge each channel with a differently rotated matrix, so lightness and
+    # chroma are dithered independently of each other
+    offsets = np.stack([
+        np.rot90(thresholds, k)[rows[:, np.newaxis], cols] for k in range(3)
+    ], axis=-1)
+    values = (lab + spread*offsets).reshape(-1, 3)
+
+    result = np.empty(len(values), dtype=np.uint8)
+    for i in range(0, len(values), _CHUNK_PIXELS):
+        chunk = values[i:i + _CHUNK_PIXELS, np.newaxis]
+        dists = hybrid_distance(chunk, lab_palette)
+        result[i:i + _CHUNK_PIXELS] = np.argmin(dists, axis=1)
+    return result.reshape(height, width)
+
+
+def _default_spread(lab_palette):
+    """Returns the mean distance from each color to its nearest neighbor"""
+    dists = hybrid_distance(lab_palette[:, np.newaxis], lab_palette)
+    np.fill_diagonal(dists, np.inf)
+    return float(dists.min(axis=1).mean())
+
+
+__all__ = ["KERNELS", "METHODS", "dither", "dither_image", "dither_strips",
+           "bayer_matrix"]
@@ -0,0 +1,68 @@
+"""Sequences of palettes for fades and color cycling effects.
+
+Each function computes a whole sequence at once, as a (frames, N, 3) array
+of OKLAB colors, interpolating between the first and last frames inclusive.
+Use to_vga() to turn a sequence into VGA palette data.
+"""
+import numpy as np
+
+from . import oklab
+
+
+def blend(start, end, frames) -> np.ndarray:
+    """Fades from one palette to another of the same size"""
+    lab_start = start.lab
+    lab_end = end.lab
+    if lab_start.shape != lab_end.shape:
+        raise ValueError("Can't blend palettes of different sizes")
+    t = _steps(frames)[:, np.newaxis, np.newaxis]
+    return lab_start + (lab_end - lab_start) * t
+
+
+def fade_to_black(palette, frames) -> np.ndarray:
+    """Fades a palette out to black, evenly in perceived lightness"""
+    lab = palette.lab
+    return lab * (1 - _steps(frames))[:, np.newaxis, np.newaxis]
+
+
+def rotate_hue(palette, frames, turns=1.0) -> np.ndarray:
+    """Rotates every color's hue, keeping its lightness and chroma.
+
+    turns is the total rotation, in full turns of the color wheel. Rotated
+    colors may fall outside the sRGB gamut, in which case to_vga() clips
+    them.
+    """
+    lab = palette.lab
+    angles = 2*np.pi*turns*_steps(frames)
+    cos = np.cos(angles)[:, np.newaxis]
+    sin = np.sin(angles)[:, np.newaxis]
+    result = np.empty((len(angles),) + lab.shape)
+    result[..., 0] = lab[:, 0]
+    result[..., 1] = cos*lab[:, 1] - sin*lab[:, 2]
+    result[..., 2] = sin*lab[:, 1] + cos*lab[:, 2]
+    return result
+
+
+def to_vga(lab_frames, dedupe=False) -> np.ndarray:
+    """Converts a sequence to VGA palette data, as bytes(palette) would.
+
+    Returns a (frames, N, 3) array of 6-bit channel values as uint8s. If
+    dedupe is true, frames that come out identical to the frame before them
+    are dropped.
+    """
+    rgb = oklab.to_srgb_array(np.asarray(lab_frames, dtype=float))
+    frames = np.clip(np.round(rgb*63), 0, 63).astype(np.uint8)
+    if dedupe and len(frames) > 1:
+        changed = np.any(frames[1:] != frames[:-1], axis=(1, 2))
+        frames = frames[np.concatenate([[True], changed])]
+    return frames
+
+
+def _steps(frames):
+    """Returns the interpolation position of each frame, from 0 to 1"""
+    if frames < 1:
+        raise ValueError("A sequence needs at least 1 frame")
+    return np.linspace(0, 1, frames) if frames > 1 else np.zeros(1)
+
+
+__all__ = ["blend", "fade_to_black", "rotate_hue", "to_vga"]
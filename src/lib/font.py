@@ -0,0 +1,28 @@
+import numpy as np
+
+
+class Font:
+    def __init__(self, data):
+        if len(data) % 256 != 0:
+            raise ValueError('Font data not a multiple of 256')
+        height = len(data) // 256
+        if height < 1 or height > 32:
+            raise ValueError(f'Font height {height} out of range')
+        # Memoryviews are kept as-is, so fonts can share a larger buffer
+        # (e.g. a memory-mapped font bank) without copying it
+        if not isinstance(data, memoryview):
+            data = bytes(data)
+        self.data = data
+        self.height = height
+        self.width = 8
+
+    def char(self, i):
+        return self.data[i*self.height:(i + 1)*self.height]
+
+    def bitmaps(self) -> np.ndarray:
+        """Returns all 256 glyphs as a (256, height, 8) array of 0s and 1s"""
+        packed = np.frombuffer(self.data, dtype=np.uint8)
+        return np.unpackbits(packed).reshape(256, self.height, self.width)
+
+
+__all__ = ["Font"]
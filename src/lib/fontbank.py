@@ -0,0 +1,197 @@
+import bisect
+import hashlib
+import mmap
+import struct
+
+from .font import Font
+
+# File layout (all integers little-endian):
+#
+#   header      MAGIC, version, font count, offset of the name index, offset
+#               of the hash index
+#   name index  one RECORD per font, sorted by name
+#   hash index  one uint32 per font: positions in the name index, sorted by
+#               the fonts' content hashes
+#   font data   raw DOS fonts, each stored once even if it has several names
+#
+# Lookups binary-search the indexes in place, so opening a bank only reads
+# the header, no matter how many fonts it holds.
+MAGIC = b"TMFB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQ")
+RECORD = struct.Struct("<48s16sQB7x")
+HASH_ENTRY = struct.Struct("<I")
+NAME_SIZE = 48
+DIGEST_SIZE = 16
+
+
+def digest(data) -> bytes:
+    """Returns the content hash used to identify fonts in a bank"""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+class FontBank:
+    """A read-only, memory-mapped collection of DOS fonts.
+
+    Fonts returned by a bank share its memory map: their data is a memoryview
+    rather than a copy. If any of them are still alive when the bank is
+    closed, the mapping stays open until they are garbage collected.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        try:
+            try:
+                magic, version, _, count, name_offset, hash_offset = \
+                    HEADER.unpack_from(self._view)
+            except struct.error:
+                raise ValueError("File too short to be a font bank")
+            if magic != MAGIC:
+                raise ValueError("Not a font bank")
+            if version != VERSION:
+                raise ValueError(f"Unsupported font bank version {version}")
+        except ValueError:
+            # Don't leave the mapping open for the garbage collector
+            self.close()
+            raise
+        self._count = count
+        self._name_offset = name_offset
+        self._hash_offset = hash_offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, name):
+        return self._find_name(name) is not None
+
+    def __getitem__(self, name) -> Font:
+        i = self._find_name(name)
+        if i is None:
+            raise KeyError(name)
+        return self._font(i)
+
+    def by_hash(self, content_hash) -> Font:
+        """Returns the font with the given digest() (bytes or hex string)"""
+        if isinstance(content_hash, str):
+            content_hash = bytes.fromhex(content_hash)
+        keys = _LazyList(
+            self._count, lambda i: self._record(self._hash_entry(i))[1])
+        i = bisect.bisect_left(keys, content_hash)
+        if i == self._count or keys[i] != content_hash:
+            raise KeyError(content_hash.hex())
+        return self._font(self._hash_entry(i))
+
+    def names(self):
+        """Returns the names of all fonts, in sorted order"""
+        return [self._record(i)[0] for i in range(self._count)]
+
+    def items(self):
+        """Yields (name, font) pairs for all fonts, in name order"""
+        for i in range(self._count):
+            yield self._record(i)[0], self._font(i)
+
+    def _hash_entry(self, i):
+        entry, = HASH_ENTRY.unpack_from(
+            self._view, self._hash_offset + i*HASH_ENTRY.size)
+        return entry
+
+    def _find_name(self, name):
+        try:
+            key = _encode_name(name)
+        except ValueError:
+            # Too long to be the name of any font in a bank
+            return None
+        keys = _LazyList(self._count, self._raw_name)
+        i = bisect.bisect_left(keys, key)
+        if i < self._count and keys[i] == key:
+            return i
+        return None
+
+    def _raw_name(self, i):
+        offset = self._name_offset + i*RECORD.size
+        return bytes(self._view[offset:offset + NAME_SIZE])
+
+    def _record(self, i):
+        name, content_hash, offset, height = RECORD.unpack_from(
+            self._view, self._name_offset + i*RECORD.size)
+        return name.rstrip(b"\0").decode("utf-8"), content_hash, offset, height
+
+    def _font(self, i):
+        _, _, offset, height = self._record(i)
+        return Font(self._view[offset:offset + 256*height])
+
+
+def build(fonts, filename):
+    """Writes a font bank from an iterable of (name, font data) pairs"""
+    records = {}
+    blobs = {}
+    for name, data in fonts:
+        Font(data)  # Validate the font
+        key = _encode_name(name)
+        if key in records:
+            raise ValueError(f"Duplicate font name: {name}")
+        content_hash = digest(data)
+        blobs.setdefault(content_hash, bytes(data))
+        records[key] = (content_hash, len(data) // 256)
+
+    names = sorted(records)
+    hash_order = sorted(range(len(names)), key=lambda i: records[names[i]][0])
+    name_offset = HEADER.size
+    hash_offset = name_offset + len(names)*RECORD.size
+    data_offset = hash_offset + len(names)*HASH_ENTRY.size
+
+    offsets = {}
+    for content_hash, blob in blobs.items():
+        offsets[content_hash] = data_offset
+        data_offset += len(blob)
+
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, 0, len(names), name_offset, hash_offset))
+        for key in names:
+            content_hash, height = records[key]
+            f.write(RECORD.pack(
+                key, content_hash, offsets[content_hash], height))
+        for i in hash_order:
+            f.write(HASH_ENTRY.pack(i))
+        for blob in blobs.values():
+            f.write(blob)
+
+
+def _encode_name(name):
+    key = name.encode("utf-8")
+    if len(key) > NAME_SIZE:
+        raise ValueError(f"Font name longer than {NAME_SIZE} bytes: {name}")
+    return key.ljust(NAME_SIZE, b"\0")
+
+
+class _LazyList:
+    """A read-only sequence that computes items on demand, for bisect"""
+
+    def __init__(self, length, get_item):
+        self._length = length
+        self._get_item = get_item
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        return self._get_item(i)
+
+
+__all__ = ["FontBank", "build", "digest"]
@@ -0,0 +1,136 @@
+import collections
+
+import numpy as np
+
+from .font import Font
+
+# Glyphs are padded to this many rows, so every glyph packs into 4 uint64s
+MAX_HEIGHT = 32
+WORDS = MAX_HEIGHT // 8
+
+# Fonts to compare against at a time, to keep memory use bounded
+CHUNK_FONTS = 1024
+
+Match = collections.namedtuple("Match", "name char distance")
+
+# Number of set bits in each byte, for NumPy versions without bitwise_count
+_POPCOUNT_TABLE = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+
+def pack(font: Font) -> np.ndarray:
+    """Packs a font's glyphs into a (256, 4) array of uint64s.
+
+    Glyphs are padded with blank rows at the bottom, so fonts of different
+    heights can be compared: rows past the end of the shorter glyph count
+    as blank.
+    """
+    rows = np.zeros((256, MAX_HEIGHT), dtype=np.uint8)
+    rows[:, :font.height] = np.frombuffer(
+        font.data, dtype=np.uint8).reshape(256, font.height)
+    return rows.view(np.uint64)
+
+
+def popcount(words) -> np.ndarray:
+    """Counts the set bits in each element of a uint64 array"""
+    words = np.asarray(words, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    counts = _POPCOUNT_TABLE[words.view(np.uint8)]
+    return counts.reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming(a, b) -> np.ndarray:
+    """Returns the number of differing pixels between packed glyphs.
+
+    Broadcasts over the leading axes: the last axis holds a glyph's words.
+    """
+    diff = np.bitwise_xor(a, b)
+    return popcount(diff).sum(axis=-1, dtype=np.int64)
+
+
+def diff(a: Font, b: Font) -> np.ndarray:
+    """Returns the number of differing pixels in each of the 256 characters"""
+    return hamming(pack(a), pack(b))
+
+
+def distance_matrix(font: Font) -> np.ndarray:
+    """Returns the distances between every pair of a font's characters"""
+    packed = pack(font)
+    return hamming(packed[:, np.newaxis], packed)
+
+
+def duplicates(font: Font, max_distance=0):
+    """Returns pairs of characters (i < j) whose glyphs nearly match"""
+    dists = distance_matrix(font)
+    i, j = np.nonzero(np.triu(dists <= max_distance, k=1))
+    return [(int(a), int(b), int(dists[a, b])) for a, b in zip(i, j)]
+
+
+class FontIndex:
+    """A searchable collection of fonts, stored as packed glyphs.
+
+    Distances are Hamming distances: the number of pixels that differ
+    between two glyphs, with glyphs aligned at the top.
+    """
+
+    def __init__(self, names, packed):
+        self.names = list(names)
+        self.packed = np.ascontiguousarray(packed, dtype=np.uint64)
+        if self.packed.shape != (len(self.names), 256, WORDS):
+            raise ValueError("Expected one (256, 4) glyph array per name")
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_fonts(cls, names, fonts):
+        packed = np.empty((len(fonts), 256, WORDS), dtype=np.uint64)
+        for i, font in enumerate(fonts):
+            packed[i] = pack(font)
+        return cls(names, packed)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data["names"].tolist(), data["packed"])
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            np.savez(f, names=np.array(self.names), packed=self.packed)
+
+    def nearest(self, glyph, k=5, char=None):
+        """Returns the k glyphs closest to a packed glyph, best first.
+
+        If char is given, only that character of each font is considered.
+        Ties are broken by font order, then character order.
+        """
+        glyph = np.asarray(glyph, dtype=np.uint64)
+        if char is None:
+            candidates = self.packed
+        else:
+            candidates = self.packed[:, char:char + 1]
+        per_font = candidates.shape[1]
+
+        dists = np.empty(len(self) * per_font, dtype=np.int64)
+        for start in range(0, len(self), CHUNK_FONTS):
+            chunk = candidates[start:start + CHUNK_FONTS]
+            dists[start*per_font:(start + len(chunk))*per_font] = (
+                hamming(chunk, glyph).ravel())
+
+        k = min(k, len(dists))
+        if k < 1:
+            return []
+        kth = np.partition(dists, k - 1)[k - 1]
+        best = np.nonzero(dists <= kth)[0]
+        best = best[np.argsort(dists[best], kind="stable")][:k]
+        return [
+            Match(self.names[i // per_font],
+                  char if char is not None else int(i % per_font),
+                  int(dists[i]))
+            for i in best
+        ]
+
+
+__all__ = ["FontIndex", "Match", "pack", "popcount", "hamming", "diff",
+           "distance_matrix", "duplicates"]
@@ -0,0 +1,40 @@
+"""Where the files in goodies/ come from.
+
+This module only uses the standard library, so that checking whether the
+goodies are up to date doesn't have to import numpy.
+"""
+import pathlib
+
+SRC_DIR = pathlib.Path(__file__).parent.parent
+GOODIES_DIR = SRC_DIR.parent / "goodies"
+PALETTES_DIR = GOODIES_DIR / "palettes"
+FONTS_DIR = GOODIES_DIR / "fonts"
+
+# Procedurally generated palettes: filename -> (generator, goal). generator
+# names a function in procedural-palettes.py, and if goal is given, the
+# palette is reordered to match that palette in goodies/palettes.
+PALETTE_RULES = {
+    "scatter.pal": ("generate_quasirandom_r3", "cga.pal"),
+    "rgb332.pal": ("generate_rgb332", "cga.pal"),
+    "ramp8.pal": ("generate_ramp8", None),
+}
+
+# Source files whose code determines the contents of each kind of output
+PALETTE_CODE = [
+    SRC_DIR / "procedural-palettes.py",
+    SRC_DIR / "lib" / "goodies.py",
+    SRC_DIR / "lib" / "instrument.py",
+    SRC_DIR / "lib" / "palette.py",
+    SRC_DIR / "lib" / "oklab.py",
+]
+FONT_CODE = [
+    SRC_DIR / "convert-bdf.py",
+    SRC_DIR / "lib" / "bdf.py",
+    SRC_DIR / "lib" / "cache.py",
+    SRC_DIR / "lib" / "codepages.py",
+    SRC_DIR / "lib" / "instrument.py",
+]
+
+
+__all__ = ["SRC_DIR", "GOODIES_DIR", "PALETTES_DIR", "FONTS_DIR",
+           "PALETTE_RULES", "PALETTE_CODE", "FONT_CODE"]
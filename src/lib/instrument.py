@@ -0,0 +1,121 @@
+import atexit
+import cProfile
+import json
+import os
+import sys
+import time
+
+# Setting this environment variable has the same effect as --profile
+ENV_VAR = "TEXTMODE_PROFILE"
+
+# Stage name -> [call count, total seconds]. None while disabled.
+_stats = None
+_start_time = None
+_profiler = None
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        entry = _stats.get(self.name)
+        if entry is None:
+            _stats[self.name] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """Returns a context manager that records the time spent in a stage.
+
+    Times and call counts are summed per stage name. Nested stages each
+    count their own inclusive time. When instrumentation is disabled, this
+    returns a shared do-nothing context manager. Work done in other
+    processes (e.g. multiprocessing pools) isn't recorded.
+    """
+    if _stats is None:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def add_argument(parser):
+    """Adds the common --profile flag to an argparse parser"""
+    parser.add_argument(
+        "--profile", type=str, metavar="FILE",
+        default=os.environ.get(ENV_VAR),
+        help=f"""
+            Record how long each stage of the conversion takes. Writes a JSON
+            summary to FILE ("-" for stderr), or a cProfile dump if FILE ends
+            in ".prof". Can also be set with the {ENV_VAR} environment
+            variable.
+            """
+    )
+
+
+def configure(output):
+    """Enables instrumentation, writing results to output at exit.
+
+    Does nothing if output is empty or None, or if already enabled.
+    """
+    global _stats, _start_time, _profiler
+    if not output or _stats is not None:
+        return
+    _stats = {}
+    _start_time = time.perf_counter()
+    if output.endswith(".prof"):
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(_write_results, output)
+
+
+def summary():
+    """Returns the stage timings recorded so far, as a JSON-friendly dict"""
+    stages = {
+        name: {"calls": calls, "seconds": seconds}
+        for name, (calls, seconds) in sorted(
+            (_stats or {}).items(), key=lambda item: -item[1][1])
+    }
+    return {
+        "argv": sys.argv,
+        "total_seconds": time.perf_counter() - (_start_time or 0),
+        "stages": stages,
+    }
+
+
+def _write_results(output):
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(output)
+        return
+    text = json.dumps(summary(), indent=2)
+    if output == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+
+__all__ = ["ENV_VAR", "stage", "add_argument", "configure", "summary"]
@@ -22,10 +22,7 @@ def to_oklab(rgb):
 
     RGB channels are floats in the range 0.0 to 1.0, inclusive.
     """
-    linear_rgb = [_to_linear(c) for c in rgb]
-    rgb = np.transpose([linear_rgb])
-    lab = m2 @ (m1 @ rgb)**(1/3)
-    return tuple(c for c in np.transpose(lab)[0])
+    return tuple(to_oklab_array(np.array(rgb, dtype=float)))
 
 
 def to_srgb(lab):
@@ -34,26 +31,57 @@ def to_srgb(lab):
 
     RGB channels are floats in the range 0.0 to 1.0, inclusive.
     """
-    lab = np.transpose([lab])
-    rgb = m1_inv @ (m2_inv @ lab)**3
-    return tuple(_to_gamma(c) for c in np.transpose(rgb)[0])
+    return tuple(to_srgb_array(np.array(lab, dtype=float)))
+
+
+def to_oklab_array(rgb):
+    """
+    Converts an array of RGB colors to an array of OKLAB colors.
+
+    The input can have any shape, as long as the last axis holds the three
+    channels: (3,), (N, 3), (H, W, 3), etc. Float arrays are treated as sRGB
+    in the range 0.0 to 1.0; uint8 arrays are treated as 0 to 255. The result
+    is always a float array with the same shape as the input.
+    """
+    rgb = np.asarray(rgb)
+    if rgb.dtype == np.uint8:
+        linear = _LINEAR_UINT8[rgb]
+    else:
+        linear = _to_linear(rgb.astype(float, copy=False))
+    lms = linear @ m1.T
+    return np.cbrt(lms) @ m2.T
+
+
+def to_srgb_array(lab):
+    """
+    Converts an array of OKLAB colors to an array of sRGB colors.
+
+    The inverse of to_oklab_array(). The last axis holds the three channels,
+    and the result is a float array of gamma-encoded values. Out-of-gamut
+    colors are not clipped.
+    """
+    lab = np.asarray(lab, dtype=float)
+    linear = ((lab @ m2_inv.T)**3) @ m1_inv.T
+    return _to_gamma(linear)
 
 
 # See https://entropymine.com/imageworsener/srgbformula/ for sRGB formulas
 def _to_linear(x):
-    """Converts a sRGB gamma-encoded value to linear"""
-    if x <= 0.04045:
-        return x/12.92
-    else:
-        return ((x + 0.055)/1.055)**2.4
+    """Converts sRGB gamma-encoded values to linear"""
+    x = np.asarray(x, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.where(x <= 0.04045, x/12.92, ((x + 0.055)/1.055)**2.4)
 
 
 def _to_gamma(x):
-    """Converts a linear value to sRGB gamma-encoded"""
-    if x <= 0.0031308:
-        return x*12.92
-    else:
-        return 1.055 * x**(1/2.4) - 0.055
+    """Converts linear values to sRGB gamma-encoded"""
+    x = np.asarray(x, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.where(x <= 0.0031308, x*12.92, 1.055 * x**(1/2.4) - 0.055)
+
+
+# Linear values for every possible 8-bit channel value
+_LINEAR_UINT8 = _to_linear(np.arange(256)/255)
 
 
-__all__ = ["to_oklab", "to_srgb"]
+__all__ = ["to_oklab", "to_srgb", "to_oklab_array", "to_srgb_array"]
@@ -1,44 +1,112 @@
 #!/usr/bin/env python3
-import math
+import collections
+import multiprocessing
 import numpy as np
-from . import oklab
+from . import instrument, oklab
 import re
-import scipy.optimize
 
-COLOR_PATTERNS = [re.compile(s) for s in [
+# Patterns for lines that contain a color. These are matched against one line
+# at a time, and are tried in order; each line matches at most one of them.
+COLOR_PATTERNS = {
     # Whitespace-separated decimal numbers at the start of a line
     # Matches: GIMP palettes, JASC palettes, PPM images
-    r"^\s*(\d{1,3})\s+(\d{1,3})\s+(\d{1,3})\b",
+    "decimal": r"[^\S\n]*(?P<r>\d{1,3})[^\S\n]+(?P<g>\d{1,3})"
+               r"[^\S\n]+(?P<b>\d{1,3})\b",
 
     # Paint.NET
-    r"^FF([0-9A-Fa-f]{6})\b",
+    "paint.net": r"FF(?P<argb>[0-9A-Fa-f]{6})\b",
 
     # .hex file
-    r"^([0-9A-Fa-f]{6})\b",
+    "hex": r"(?P<hex>[0-9A-Fa-f]{6})\b",
 
     # CSS color code (with optional alpha channel)
-    r"#([0-9A-Fa-f]{6})(?:[0-9A-Fa-f]{2})?\b"
-]]
+    "css": r".*?#(?P<css>[0-9A-Fa-f]{6})(?:[0-9A-Fa-f]{2})?\b",
+}
+
+# All of the above, combined into a single pattern
+COLOR_PATTERN = re.compile(
+    "^(?:" + "|".join(COLOR_PATTERNS.values()) + ")", re.MULTILINE)
+
+# Most colors a palette can have: the size of the VGA DAC's color table
+MAX_COLORS = 256
+
+# Known formats, identified by their headers, and the patterns that can match
+# their colors
+FORMATS = {
+    "gimp": ("GIMP Palette", re.compile(
+        "^" + COLOR_PATTERNS["decimal"], re.MULTILINE)),
+    "jasc": ("JASC-PAL", re.compile(
+        "^" + COLOR_PATTERNS["decimal"], re.MULTILINE)),
+    "paint.net": (";paint.net Palette File", re.compile(
+        "^" + COLOR_PATTERNS["paint.net"], re.MULTILINE)),
+}
 
 
 class Palette:
+    """An ordered list of RGB colors, with channels from 0.0 to 1.0.
+
+    The colors are stored as an (N, 3) float array, available read-only as
+    rgb, or as a list of tuples as colors. Assigning to colors replaces them.
+    The OKLAB coordinates and VGA bytes are computed on first use and cached
+    until then. Palettes compare equal if their VGA bytes are equal. They
+    can be reordered in place, so they aren't hashable.
+    """
+    __slots__ = ("_rgb", "_lab", "_bytes")
+
     def __init__(self, colors):
-        colors = list(colors)
-        if len(colors) != 16:
-            raise ValueError("Palette must have 16 entries")
         self.colors = colors
 
+    def __len__(self):
+        return len(self._rgb)
+
+    @property
+    def colors(self):
+        return [tuple(color) for color in self._rgb.tolist()]
+
+    @colors.setter
+    def colors(self, colors):
+        rgb = np.array(list(colors), dtype=float)
+        if not 1 <= len(rgb) <= MAX_COLORS:
+            raise ValueError(f"Palette must have 1 to {MAX_COLORS} entries")
+        if rgb.ndim != 2 or rgb.shape[1] != 3:
+            raise ValueError("Palette colors must be RGB triples")
+        rgb.flags.writeable = False
+        self._rgb = rgb
+        self._lab = None
+        self._bytes = None
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """The colors as a read-only (N, 3) array"""
+        return self._rgb
+
+    @property
+    def lab(self) -> np.ndarray:
+        """The colors' OKLAB coordinates as a read-only (N, 3) array"""
+        if self._lab is None:
+            lab = oklab.to_oklab_array(self._rgb)
+            lab.flags.writeable = False
+            self._lab = lab
+        return self._lab
+
     @classmethod
     def from_bytes(cls, data):
-        "Read 16 colors in VGA palette format (3 bytes/color, range 0-63)"
-        if len(data) != 16*3 or any(x > 63 for x in data):
+        """Read colors in VGA palette format (3 bytes/color, range 0-63).
+
+        This accepts any number of colors up to 256, e.g. 48 bytes for a
+        16-color text-mode palette, or 768 bytes for a full 256-color one.
+        """
+        data = bytes(data)
+        ints = np.frombuffer(data, dtype=np.uint8)
+        if (len(data) % 3 != 0 or not 3 <= len(data) <= MAX_COLORS*3
+                or ints.max() > 63):
             raise ValueError("Invalid binary palette format")
-        floats = [min(1.0, x/63) for x in data]
-        colors = [tuple(floats[i:i + 3]) for i in range(0, 16*3, 3)]
-        return cls(colors)
+        palette = cls(ints.reshape(-1, 3) / 63)
+        palette._bytes = data
+        return palette
 
     @classmethod
-    def from_text(cls, text: str):
+    def from_text(cls, text: str, size=16):
         """Import a palette from any number of text-based formats.
 
         This function expects a line-based format with one color per line,
@@ -58,68 +126,190 @@ class Palette:
         It can also import other things that match these regexes, such as
         PPM images, or text files with copy/pasted CSS hex codes.
 
-        Raises ValueError if it doesn't find exactly 16 colors in the palette.
+        If the text starts with the header of one of the FORMATS, only lines
+        that are valid for that format are read as colors.
+
+        Raises ValueError if it doesn't find exactly size colors in the
+        palette. If size is None, any number of colors up to 256 is accepted.
         """
-        global COLOR_PATTERNS
-        colors = []
-        for line in text.splitlines():
-            # Match the line against each of our regexes
-            match = None
-            for pattern in COLOR_PATTERNS:
-                match = pattern.search(line)
-                if match:
-                    break
-
-            # If we got a match, this line represents a color
-            if match:
-                if len(match.groups()) == 1:
-                    # Read hex string
-                    hex_str = match[1]
-                    components = (hex_str[i:i + 2] for i in range(0, 6, 2))
-                    floats = (int(x, base=16)/255 for x in components)
-                    colors.append(tuple(floats))
-                elif len(match.groups()) == 3:
-                    # Read decimal triplet
-                    ints = [int(x) for x in match.groups()]
-                    if all(x < 256 for x in ints):
-                        floats = (x/255 for x in ints)
-                        colors.append(tuple(floats))
-
-        if len(colors) != 16:
-            raise ValueError("Couldn't interpret data as 16-color palette")
+        with instrument.stage("palette.parse"):
+            colors = parse_colors(text, detect_format(text))
+        if size is not None and len(colors) != size:
+            raise ValueError(
+                f"Couldn't interpret data as {size}-color palette")
+        if not colors:
+            raise ValueError("Couldn't find any colors in palette")
         return cls(colors)
 
     def reorder(self, target):
         """
         Reorder the palette's colors to more closely match the target's colors
+
+        The palettes don't have to be the same size. If the target is larger,
+        each of our colors is matched to a different target color, and our
+        colors are put in the order of the target colors they matched. If the
+        target is smaller, the colors that best match it come first, in the
+        target's order, followed by the rest in their original order.
         """
-        lab_self = [oklab.to_oklab(c) for c in self.colors]
-        lab_target = [oklab.to_oklab(c) for c in target.colors]
-
-        def dist(x, y):
-            """
-            Return distance between two LAB colors.
-
-            This uses the hybrid distance formula as described here:
-            https://en.wikipedia.org/wiki/Color_difference#Other_geometric_constructions
-            """ # noqa
-            lightness = abs(x[0] - y[0])
-            chroma = math.sqrt((x[1] - y[1])**2 + (x[2] - y[2])**2)
-            return lightness + chroma
-
-        # Calculate costs matrix.
-        # Each column represents a color in our own palette.
-        # Each row represents a color in the target palette.
-        costs = np.array([
-            [dist(target_color, our_color) for our_color in lab_self]
-            for target_color in lab_target
-        ])
+        with instrument.stage("palette.color-math"):
+            costs = self._costs(target)
 
         # Reorder self
-        _, col_indexes = scipy.optimize.linear_sum_assignment(costs)
-        self.colors = [self.colors[i] for i in col_indexes]
+        with instrument.stage("palette.assignment"):
+            col_indexes = _solve_assignment(costs)
+        self._permute(col_indexes)
+
+    def match_slots(self, target):
+        """Pairs each of our colors with a different color in the target.
+
+        Returns an array with the index of each color's target color, or -1
+        for colors left over when the target has fewer colors than we do.
+        This is useful for placing a small palette into some of the slots of
+        a larger one, e.g. 16 text-mode colors in a 256-color palette.
+        """
+        import scipy.optimize
+        rows, cols = scipy.optimize.linear_sum_assignment(self._costs(target))
+        slots = np.full(len(self), -1)
+        slots[cols] = rows
+        return slots
+
+    def _costs(self, target):
+        return cost_matrix(self.lab, target.lab)
+
+    def _permute(self, order):
+        """Puts the colors in the given order, keeping the cached OKLAB"""
+        lab = self._lab
+        self.colors = self._rgb[order]
+        if lab is not None:
+            lab = lab[order]
+            lab.flags.writeable = False
+            self._lab = lab
 
     def __bytes__(self):
-        floats = (chan for color in self.colors for chan in color)
-        ints = (round(x*63) for x in floats)
-        return bytes(max(0, min(x, 63)) for x in ints)
+        if self._bytes is None:
+            ints = np.clip(np.round(self._rgb*63), 0, 63)
+            self._bytes = ints.astype(np.uint8).tobytes()
+        return self._bytes
+
+    def __eq__(self, other):
+        if not isinstance(other, Palette):
+            return NotImplemented
+        return bytes(self) == bytes(other)
+
+
+def detect_format(text: str):
+    """Returns the name of a known palette format from its header, or None"""
+    for name, (header, _) in FORMATS.items():
+        if text.startswith(header):
+            return name
+    return None
+
+
+def parse_colors(text: str, format=None):
+    """Returns all the colors found in a text-based palette, in order.
+
+    See Palette.from_text() for details. If format is given (see FORMATS), only
+    lines that are valid for that format are considered; otherwise every line
+    is matched against all of the COLOR_PATTERNS.
+    """
+    pattern = FORMATS[format][1] if format else COLOR_PATTERN
+
+    # Normalize line endings, so that patterns can match line by line
+    text = "\n".join(text.splitlines())
+
+    colors = []
+    for match in pattern.finditer(text):
+        groups = match.groupdict()
+        if groups.get("r") is not None:
+            # Read decimal triplet
+            ints = (int(groups["r"]), int(groups["g"]), int(groups["b"]))
+            if all(x < 256 for x in ints):
+                colors.append(tuple(x/255 for x in ints))
+        else:
+            # Read hex string
+            hex_str = groups.get("argb") or groups.get("hex") or groups["css"]
+            colors.append(tuple(x/255 for x in bytes.fromhex(hex_str)))
+    return colors
+
+
+def hybrid_distance(x, y):
+    """
+    Return distance between LAB colors, broadcasting over the leading axes.
+
+    This uses the hybrid distance formula as described here:
+    https://en.wikipedia.org/wiki/Color_difference#Other_geometric_constructions
+    """ # noqa
+    diff = np.asarray(x) - np.asarray(y)
+    lightness = np.abs(diff[..., 0])
+    chroma = np.sqrt(diff[..., 1]**2 + diff[..., 2]**2)
+    return lightness + chroma
+
+
+def cost_matrix(lab_self, lab_target):
+    """
+    Calculate the costs matrix used for reordering a palette.
+
+    Each column represents a color in our own palette.
+    Each row represents a color in the target palette.
+
+    Either argument can have leading batch dimensions: given an (N, 16, 3)
+    stack of palettes, this returns an (N, 16, 16) stack of cost matrices.
+    The palettes can be different sizes, giving rectangular matrices.
+    """
+    lab_self = np.asarray(lab_self)
+    lab_target = np.asarray(lab_target)
+    return hybrid_distance(
+        lab_target[..., :, np.newaxis, :],
+        lab_self[..., np.newaxis, :, :]
+    )
+
+
+def reorder_all(palettes, target, processes=None, chunksize=64):
+    """
+    Reorder many palettes in place to match the same target palette.
+
+    This is equivalent to calling palette.reorder(target) on each palette,
+    but the target is only converted to LAB once, and the costs matrices are
+    calculated in one batch per palette size. The assignment problems are
+    then solved by a pool of worker processes. If processes is 1, or there
+    is only one palette, no pool is used.
+    """
+    palettes = list(palettes)
+    if not palettes:
+        return
+    with instrument.stage("palette.color-math"):
+        lab_target = target.lab
+        by_size = collections.defaultdict(list)
+        for i, p in enumerate(palettes):
+            by_size[len(p)].append(i)
+        costs = [None] * len(palettes)
+        for indexes in by_size.values():
+            lab_all = oklab.to_oklab_array(
+                np.stack([palettes[i].rgb for i in indexes]))
+            for i, c in zip(indexes, cost_matrix(lab_all, lab_target)):
+                costs[i] = c
+
+    with instrument.stage("palette.assignment"):
+        if processes == 1 or len(palettes) == 1:
+            orders = [_solve_assignment(c) for c in costs]
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                orders = pool.map(_solve_assignment, costs, chunksize)
+
+    for palette, order in zip(palettes, orders):
+        palette._permute(order)
+
+
+def _solve_assignment(costs):
+    """Return the column order that minimizes the given costs matrix.
+
+    If there are more columns than rows, the unassigned columns go last, in
+    their original order.
+    """
+    # scipy is slow to import, so only load it once a palette needs it
+    import scipy.optimize
+    _, col_indexes = scipy.optimize.linear_sum_assignment(costs)
+    if len(col_indexes) < costs.shape[1]:
+        unused = np.setdiff1d(np.arange(costs.shape[1]), col_indexes)
+        col_indexes = np.concatenate([col_indexes, unused])
+    return col_indexes
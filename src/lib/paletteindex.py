@@ -0,0 +1,128 @@
+import collections
+import heapq
+
+import numpy as np
+
+from . import oklab
+from .palette import cost_matrix
+
+# Candidates to check at a time, once the cheap bounds have sorted them
+CHUNK_SIZE = 256
+
+Match = collections.namedtuple("Match", "name cost order")
+
+
+class PaletteIndex:
+    """A searchable collection of palettes.
+
+    Palettes are compared with the same order-independent cost that
+    Palette.reorder() minimizes: the total hybrid OKLAB distance between
+    colors, after optimally pairing them up.
+    """
+
+    def __init__(self, names, colors):
+        self.names = list(names)
+        self.colors = np.asarray(colors, dtype=float)
+        if self.colors.ndim != 3 or self.colors.shape[0] != len(self.names):
+            raise ValueError("Expected one (N, 3) color array per name")
+        self.lab = oklab.to_oklab_array(self.colors)
+
+        # Precomputed terms for the cheap lower bounds; see _lower_bounds()
+        self._sorted_lightness = np.sort(self.lab[..., 0], axis=1)
+        self._centroids = self.lab.mean(axis=1)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_palettes(cls, names, palettes):
+        """Builds an index from Palette objects, which must all be one size"""
+        if len({len(p) for p in palettes}) > 1:
+            raise ValueError("Palettes must all have the same size")
+        return cls(names, [p.rgb for p in palettes])
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data["names"].tolist(), data["colors"])
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            np.savez(f, names=np.array(self.names), colors=self.colors)
+
+    def query(self, palette, k=5):
+        """Returns the k palettes closest to the given one, best first.
+
+        Each result is a Match with the palette's name, its cost, and the
+        order that rearranges its colors to best match the query palette
+        (as Palette.reorder() would).
+
+        Most palettes are ruled out by cheap lower bounds on their cost, so
+        the exact assignment problem only has to be solved for a few of them.
+        """
+        # scipy is slow to import, so only load it once there's a query
+        import scipy.optimize
+
+        lab_query = palette.lab
+        if lab_query.shape != self.lab.shape[1:]:
+            raise ValueError("Query palette has the wrong number of colors")
+
+        bounds = self._lower_bounds(lab_query)
+        candidates = np.argsort(bounds, kind="stable")
+
+        # Max-heap of the best k matches so far, as (-cost, -index, order)
+        best = []
+
+        def worst_cost():
+            return -best[0][0] if len(best) == k else np.inf
+
+        for start in range(0, len(candidates), CHUNK_SIZE):
+            chunk = candidates[start:start + CHUNK_SIZE]
+            chunk = chunk[bounds[chunk] < worst_cost()]
+            if len(chunk) == 0:
+                # Bounds are sorted, so no later chunk can do better
+                break
+
+            # Tighten the bounds: each query color costs at least as much as
+            # its nearest candidate color, and vice versa
+            costs = cost_matrix(self.lab[chunk], lab_query)
+            row_bounds = costs.min(axis=2).sum(axis=1)
+            col_bounds = costs.min(axis=1).sum(axis=1)
+            chunk_bounds = np.maximum(
+                bounds[chunk], np.maximum(row_bounds, col_bounds))
+
+            for j in np.argsort(chunk_bounds, kind="stable"):
+                if chunk_bounds[j] >= worst_cost():
+                    break
+                rows, cols = scipy.optimize.linear_sum_assignment(costs[j])
+                cost = float(costs[j][rows, cols].sum())
+                entry = (-cost, -int(chunk[j]), cols)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif cost < worst_cost():
+                    heapq.heapreplace(best, entry)
+
+        results = sorted(best, key=lambda e: (-e[0], -e[1]))
+        return [
+            Match(self.names[-i], -neg_cost, cols)
+            for neg_cost, i, cols in results
+        ]
+
+    def _lower_bounds(self, lab_query):
+        """Returns a cheap lower bound on each stored palette's cost.
+
+        The hybrid distance is at least the lightness difference, so the cost
+        is at least that of optimally pairing up lightnesses alone, which is
+        done by pairing them in sorted order. It's also at least the
+        Euclidean distance, so by the triangle inequality the cost is at
+        least N times the distance between the palettes' centroids.
+        """
+        num_colors = len(lab_query)
+        lightness = np.abs(
+            self._sorted_lightness - np.sort(lab_query[:, 0])).sum(axis=1)
+        centroid = num_colors * np.linalg.norm(
+            self._centroids - lab_query.mean(axis=0), axis=1)
+        return np.maximum(lightness, centroid)
+
+
+__all__ = ["PaletteIndex", "Match"]
@@ -0,0 +1,68 @@
+import functools
+
+import numpy as np
+from PIL import Image
+
+from . import oklab, vgacolor
+from .palette import hybrid_distance
+
+# Rows of pixels to convert at a time, to keep memory use bounded
+STRIP_ROWS = 256
+
+# Maps 8-bit channel values to the nearest 6-bit VGA channel values
+_TO_6BIT = ((np.arange(256)*63 + 127)//255).astype(np.uint32)
+
+
+def quantize(im: Image.Image, palette, strip_rows=STRIP_ROWS) -> np.ndarray:
+    """Map an image onto a palette, returning a 2D array of color indexes.
+
+    Each pixel is rounded to the nearest 18-bit VGA color, and then mapped to
+    the palette color closest to it in OKLAB space. Closeness is measured
+    with the same hybrid distance formula used by Palette.reorder().
+    """
+    table = lookup_table(palette)
+    result = np.empty((im.height, im.width), dtype=np.uint8)
+    for y in range(0, im.height, strip_rows):
+        y_end = min(y + strip_rows, im.height)
+        strip = im.crop((0, y, im.width, y_end)).convert("RGB")
+        r, g, b = np.moveaxis(_TO_6BIT[np.asarray(strip)], -1, 0)
+        result[y:y_end] = table[r << 12 | g << 6 | b]
+    return result
+
+
+def quantize_image(im: Image.Image, palette) -> Image.Image:
+    """Map an image onto a palette, returning a "P" mode image."""
+    indexes = quantize(im, palette)
+    result = Image.fromarray(indexes, mode="P")
+    result.putpalette(palette_bytes(palette))
+    return result
+
+
+def palette_bytes(palette) -> bytes:
+    """Return the palette's colors as 8-bit RGB triplets for putpalette()"""
+    return np.round(palette.rgb*255).astype(np.uint8).tobytes()
+
+
+def lookup_table(palette) -> np.ndarray:
+    """Return a table mapping each 18-bit VGA color to a palette index.
+
+    The table has 64**3 entries, indexed by (r << 12 | g << 6 | b), where r, g
+    and b are 6-bit channel values. Tables are cached per palette.
+    """
+    return _build_lookup_table(tuple(palette.colors))
+
+
+@functools.lru_cache(maxsize=16)
+def _build_lookup_table(colors, chunk_size=1 << 14):
+    lab_palette = oklab.to_oklab_array(colors)
+    lab_vga = vgacolor.table()
+    table = np.empty(len(lab_vga), dtype=np.uint8)
+    for i in range(0, len(lab_vga), chunk_size):
+        chunk = lab_vga[i:i + chunk_size, np.newaxis, :]
+        dists = hybrid_distance(chunk, lab_palette)
+        table[i:i + chunk_size] = np.argmin(dists, axis=1)
+    table.flags.writeable = False
+    return table
+
+
+__all__ = ["quantize", "quantize_image", "lookup_table", "palette_bytes"]
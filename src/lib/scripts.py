@@ -0,0 +1,29 @@
+import importlib.util
+import pathlib
+import sys
+
+SCRIPTS_DIR = pathlib.Path(__file__).parent.parent
+
+
+def load_script(name):
+    """Imports a command-line script (e.g. "convert-bdf") as a module.
+
+    The scripts' filenames contain dashes, so they can't be imported with a
+    regular import statement. Modules are cached, like regular imports.
+    """
+    module_name = "scripts." + name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    path = SCRIPTS_DIR / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+__all__ = ["load_script"]
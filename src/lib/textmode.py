@@ -0,0 +1,171 @@
+import functools
+
+import numpy as np
+from PIL import Image
+
+from . import oklab
+from .font import Font
+from .palette import hybrid_distance
+from .quantize import palette_bytes
+
+# Cells to score at a time, to keep memory use bounded
+CHUNK_CELLS = 512
+
+
+def convert(im: Image.Image, font: Font, palette, cols=80, rows=25,
+            blink=True):
+    """Converts an image to a text-mode screen.
+
+    The image is resized to fit a grid of cols x rows character cells. For
+    each cell, this picks the character and the foreground/background colors
+    that minimize the total distance between the cell's pixels and the
+    colors drawn there, using the palette's hybrid OKLAB distance.
+
+    If blink is true, the attribute's high bit is reserved for blinking, so
+    only the first 8 palette colors are available as backgrounds.
+
+    Returns a pair of (rows, cols) uint8 arrays: characters and attributes.
+    """
+    cells = split_cells(fit(im, font, cols, rows), font.height)
+    chars, attrs = convert_cells(cells, font, palette, blink)
+    return chars.reshape(rows, cols), attrs.reshape(rows, cols)
+
+
+def fit(im: Image.Image, font: Font, cols=80, rows=25) -> np.ndarray:
+    """Resizes an image to exactly cover a grid of character cells.
+
+    Returns the pixels as a (rows*height, cols*8, 3) uint8 array.
+    """
+    im = im.convert("RGB").resize((cols*8, rows*font.height), Image.LANCZOS)
+    return np.asarray(im)
+
+
+def split_cells(pixels, height) -> np.ndarray:
+    """Rearranges fit()'s pixels into (rows*cols, pixels per cell, 3)"""
+    rows = pixels.shape[0] // height
+    cols = pixels.shape[1] // 8
+    cells = pixels.reshape(rows, height, cols, 8, 3).swapaxes(1, 2)
+    return cells.reshape(rows*cols, height*8, 3)
+
+
+def convert_cells(cells, font: Font, palette, blink=True):
+    """Picks a character and attribute for each of an array of cells.
+
+    cells is an (N, pixels per cell, 3) array of RGB pixels, as returned by
+    split_cells(). See convert() for how the choice is made. Returns a pair
+    of length-N uint8 arrays: characters and attributes.
+    """
+    masks, char_codes = _glyph_masks(bytes(font.data))
+
+    # Attributes can only select from the first 16 colors
+    lab_palette = palette.lab[:16]
+    num_bg = 8 if blink else len(lab_palette)
+
+    chars = np.empty(len(cells), dtype=np.uint8)
+    attrs = np.empty(len(cells), dtype=np.uint8)
+    for start in range(0, len(cells), CHUNK_CELLS):
+        chunk = oklab.to_oklab_array(cells[start:start + CHUNK_CELLS])
+
+        # Distance from each pixel to each palette color: (n, pixels, colors)
+        dists = hybrid_distance(chunk[:, :, np.newaxis, :], lab_palette)
+
+        # A cell's error is the sum of its foreground pixels' distances to the
+        # foreground color, plus its background pixels' distances to the
+        # background color. The two terms are independent, so rather than
+        # trying all fg/bg pairs, each can be minimized separately.
+        fg_errors = masks @ dists                   # (n, glyphs, colors)
+        bg_errors = dists.sum(axis=1)[:, np.newaxis, :] - fg_errors
+        bg_errors = bg_errors[:, :, :num_bg]
+        fg = np.argmin(fg_errors, axis=2)
+        bg = np.argmin(bg_errors, axis=2)
+        errors = (np.take_along_axis(fg_errors, fg[..., np.newaxis], 2)
+                  + np.take_along_axis(bg_errors, bg[..., np.newaxis], 2))
+
+        best = np.argmin(errors[..., 0], axis=1)
+        cell_indexes = np.arange(len(chunk))
+        chars[start:start + len(chunk)] = char_codes[best]
+        attrs[start:start + len(chunk)] = (
+            bg[cell_indexes, best] << 4 | fg[cell_indexes, best])
+
+    return chars, attrs
+
+
+@functools.lru_cache(maxsize=8)
+def _glyph_masks(data):
+    """Returns (distinct glyphs as float masks, a char code for each)"""
+    font = Font(data)
+    # Identical glyphs always score the same, so only score one of each
+    masks, char_codes = np.unique(
+        font.bitmaps().reshape(256, font.height*8), axis=0,
+        return_index=True)
+    return masks.astype(float), char_codes
+
+
+def to_bytes(chars, attrs) -> bytes:
+    """Interleaves characters and attributes, as in a B800 screen buffer"""
+    return np.stack([chars, attrs], axis=-1).astype(np.uint8).tobytes()
+
+
+def from_bytes(data, cols=80, rows=None):
+    """Splits a B800 screen buffer into characters and attributes.
+
+    If rows is None, the screen is as tall as the data allows; any bytes past
+    the last full row (e.g. padding at the end of a 4 KB video page) are
+    ignored. Returns a pair of (rows, cols) uint8 arrays.
+    """
+    if rows is None:
+        rows = max(1, len(data) // (2*cols))
+    if len(data) < rows*cols*2:
+        raise ValueError(f"Screen buffer too small for {cols}x{rows} cells")
+    cells = np.frombuffer(data, dtype=np.uint8, count=rows*cols*2)
+    cells = cells.reshape(rows, cols, 2)
+    return cells[..., 0], cells[..., 1]
+
+
+def render(chars, attrs, font: Font, palette, blink=True,
+           blink_visible=True) -> Image.Image:
+    """Draws a text-mode screen as a "P" mode image.
+
+    If blink is true, the attribute's high bit makes a cell blink, rather than
+    selecting a bright background color. blink_visible picks which phase of
+    the blink to draw: with it false, blinking characters are hidden.
+    """
+    rows, cols = chars.shape
+    atlas = glyph_atlas(font, blink, blink_visible)
+    pixels = atlas[chars, attrs]                    # (rows, cols, h, 8)
+    pixels = pixels.swapaxes(1, 2).reshape(rows*font.height, cols*8)
+    result = Image.fromarray(pixels, mode="P")
+    result.putpalette(palette_bytes(palette))
+    return result
+
+
+def glyph_atlas(font: Font, blink=True, blink_visible=True) -> np.ndarray:
+    """Returns every glyph drawn in every attribute, for fast rendering.
+
+    The result is a read-only (256 chars, 256 attributes, height, 8) array of
+    palette indexes, so a whole screen can be drawn with one lookup. It
+    doesn't depend on the palette, which is only applied to the final image.
+    Atlases are cached per font and blink mode.
+    """
+    return _build_atlas(bytes(font.data), blink, blink_visible)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_atlas(data, blink, blink_visible):
+    bits = Font(data).bitmaps().astype(bool)
+    attrs = np.arange(256, dtype=np.uint8)
+    fg = attrs & 0x0F
+    bg = attrs >> 4
+    if blink:
+        bg = bg & 0x07
+        if not blink_visible:
+            fg = np.where(attrs & 0x80, bg, fg)
+    atlas = np.where(bits[:, np.newaxis],
+                     fg[:, np.newaxis, np.newaxis],
+                     bg[:, np.newaxis, np.newaxis])
+    atlas.flags.writeable = False
+    return atlas
+
+
+__all__ = ["convert", "fit", "split_cells", "convert_cells", "to_bytes",
+           "from_bytes", "render", "glyph_atlas"]
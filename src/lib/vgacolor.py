@@ -0,0 +1,205 @@
+"""OKLAB coordinates for every color that VGA's 18-bit DAC can display.
+
+VGA colors are triples of 6-bit channel values (0-63), numbered in table
+order as r << 12 | g << 6 | b. The table of their OKLAB coordinates is
+computed once, saved as a .npy file in the cache directory, and memory-mapped
+from then on, so every process shares the same copy.
+"""
+import functools
+import itertools
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+
+from . import oklab
+from .cache import default_cache_dir
+from .palette import hybrid_distance
+
+# Bump this whenever the table's layout or the OKLAB conversion changes
+TABLE_VERSION = 1
+
+NUM_COLORS = 64**3
+
+# Side length of the OKLAB grid cells used to find nearby VGA colors, and how
+# many cells across nearest_vga() will search before giving up and comparing
+# against every color instead
+GRID_SIZE = 0.01
+MAX_SPAN = 4
+_GRID_ORIGIN = np.array([-0.5, -0.5, -0.5])
+_GRID_DIM = 256
+
+# Offsets to each VGA color's neighbors, with itself first: (27, 3)
+_NEIGHBORS = np.stack(np.meshgrid(
+    [0, -1, 1], [0, -1, 1], [0, -1, 1], indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def table(cache_dir=None) -> np.ndarray:
+    """Returns the (64**3, 3) OKLAB table, indexed by VGA color number.
+
+    The table is read-only. If the cache directory can't be written to, it's
+    computed in memory instead.
+    """
+    return _load_table(str(cache_dir or default_cache_dir()))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_table(cache_dir):
+    path = pathlib.Path(cache_dir, f"vga-oklab-v{TABLE_VERSION}.npy")
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+
+    lab = oklab.to_oklab_array(vga_colors())
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, lab)
+        os.replace(tmp_name, path)
+        return np.load(path, mmap_mode="r")
+    except OSError:
+        lab.flags.writeable = False
+        return lab
+
+
+def vga_colors() -> np.ndarray:
+    """Return all 64**3 VGA colors as an array of floats, in table order"""
+    levels = np.arange(64)/63
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    return np.stack([r, g, b], axis=-1).reshape(-1, 3)
+
+
+def color_number(vga) -> np.ndarray:
+    """Converts (..., 3) 6-bit VGA triples to VGA color numbers"""
+    vga = np.asarray(vga, dtype=np.int64)
+    if np.any((vga < 0) | (vga > 63)):
+        raise ValueError("VGA channel values must be in the range 0-63")
+    return vga[..., 0] << 12 | vga[..., 1] << 6 | vga[..., 2]
+
+
+def oklab_of(vga) -> np.ndarray:
+    """Returns the OKLAB coordinates of (..., 3) 6-bit VGA triples"""
+    return table()[color_number(vga)]
+
+
+def nearest_vga(lab) -> np.ndarray:
+    """Returns the VGA colors closest to (..., 3) OKLAB points.
+
+    Closeness is measured with the same hybrid distance formula used by
+    Palette.reorder(). Rather than comparing against all 64**3 colors, this
+    starts from each point's plain sRGB rounding and walks downhill: each
+    step moves to the closest color in the surrounding 3x3x3 block, until
+    no neighbor is closer. The walk can get stuck a hair short of the
+    nearest color, so its result is then checked against every color close
+    enough to possibly beat it (see _refine()). Returns 6-bit triples as an
+    array of uint8s.
+    """
+    lab = np.asarray(lab, dtype=float)
+    shape = lab.shape
+    lab = lab.reshape(-1, 3)
+    lab_table = table()
+    current = np.round(np.clip(oklab.to_srgb_array(lab), 0, 1) * 63)
+    current = current.astype(np.int64)
+
+    # Only points that moved on the last step need another look
+    active = np.arange(len(lab))
+    while len(active):
+        candidates = np.clip(
+            current[active, np.newaxis, :] + _NEIGHBORS, 0, 63)
+        dists = hybrid_distance(
+            lab_table[color_number(candidates)], lab[active, np.newaxis, :])
+        best = candidates[np.arange(len(active)), np.argmin(dists, axis=1)]
+        moved = np.any(best != current[active], axis=1)
+        current[active] = best
+        active = active[moved]
+
+    numbers = _refine(lab, color_number(current))
+    current = np.stack([numbers >> 12, numbers >> 6 & 63, numbers & 63], -1)
+    return current.reshape(shape).astype(np.uint8)
+
+
+def _refine(lab, numbers):
+    """Replaces approximate nearest VGA colors with exact ones.
+
+    The hybrid distance is never less than the Euclidean distance, so any
+    color closer than the current guess must lie within a cube around the
+    point whose half-width is the current distance. Colors are bucketed
+    into a grid, and only the grid cells that the cube overlaps are
+    searched. Returns the exact VGA color numbers.
+    """
+    lab_table = table()
+    cell_ids, cell_order = _grid()
+    numbers = numbers.copy()
+    best = hybrid_distance(lab_table[numbers], lab)
+    low = np.floor((lab - best[:, np.newaxis] - _GRID_ORIGIN) / GRID_SIZE)
+    high = np.floor((lab + best[:, np.newaxis] - _GRID_ORIGIN) / GRID_SIZE)
+    low = low.astype(np.int64)
+    high = high.astype(np.int64)
+
+    # Points far from every color (e.g. out of gamut) would need too many
+    # cells searched, so they are compared against every color instead
+    far = np.any(high - low >= MAX_SPAN, axis=1)
+    for i in np.nonzero(far)[0]:
+        numbers[i] = np.argmin(hybrid_distance(lab_table, lab[i]))
+
+    span = range(MAX_SPAN)
+    for offset in itertools.product(span, span, span):
+        cells = low + offset
+        points = np.nonzero(~far & np.all(cells <= high, axis=1))[0]
+        cells = cells[points]
+        ids = _cell_id(np.clip(cells, 0, _GRID_DIM - 1))
+        starts = np.searchsorted(cell_ids, ids, "left")
+        lengths = np.searchsorted(cell_ids, ids, "right") - starts
+        lengths[np.any((cells < 0) | (cells >= _GRID_DIM), axis=1)] = 0
+        if not lengths.any():
+            continue
+
+        # Flatten the colors in every point's cell into one long list
+        owners = np.repeat(points, lengths)
+        ends = np.cumsum(lengths)
+        flat = np.arange(ends[-1])
+        flat += np.repeat(starts - ends + lengths, lengths)
+        candidates = cell_order[flat]
+        dists = hybrid_distance(lab_table[candidates], lab[owners])
+
+        # Keep each point's closest candidate, if it beats the current best
+        better = dists < best[owners]
+        owners = owners[better]
+        candidates = candidates[better]
+        dists = dists[better]
+        order = np.lexsort((dists, owners))
+        _, first = np.unique(owners[order], return_index=True)
+        winners = order[first]
+        numbers[owners[winners]] = candidates[winners]
+        best[owners[winners]] = dists[winners]
+    return numbers
+
+
+@functools.lru_cache(maxsize=None)
+def _grid():
+    """Returns (sorted cell IDs, color numbers in that order) for table()"""
+    cells = np.floor((table() - _GRID_ORIGIN) / GRID_SIZE).astype(np.int64)
+    ids = _cell_id(cells)
+    order = np.argsort(ids, kind="stable")
+    return ids[order], order
+
+
+def _cell_id(cells):
+    l, a, b = np.moveaxis(cells, -1, 0)
+    return (l*_GRID_DIM + a)*_GRID_DIM + b
+
+
+def to_vga(rgb) -> np.ndarray:
+    """Rounds (..., 3) sRGB floats to their perceptually nearest VGA colors.
+
+    Unlike round(x*63), this picks the VGA color that is closest in OKLAB
+    space, rather than the closest per channel. Returns 6-bit triples.
+    """
+    return nearest_vga(oklab.to_oklab_array(rgb))
+
+
+__all__ = ["TABLE_VERSION", "NUM_COLORS", "table", "vga_colors",
+           "color_number", "oklab_of", "nearest_vga", "to_vga"]
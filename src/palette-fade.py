@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+from lib import fade, instrument
+from lib.palette import Palette
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="""
+            Generate a sequence of VGA palettes for a fade or color cycling
+            effect. Frames are written back to back, each in the same format
+            as a .pal file.
+            """
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    blend_parser = subparsers.add_parser(
+        "blend", help="fade from one palette to another")
+    blend_parser.add_argument("start", type=str, help="first palette")
+    blend_parser.add_argument("end", type=str, help="last palette")
+
+    black_parser = subparsers.add_parser(
+        "black", help="fade a palette out to black")
+    black_parser.add_argument("palette", type=str, help="palette to fade")
+
+    rotate_parser = subparsers.add_parser(
+        "rotate", help="rotate a palette's hues around the color wheel")
+    rotate_parser.add_argument("palette", type=str, help="palette to rotate")
+    rotate_parser.add_argument(
+        "--turns", "-t", type=float, default=1.0,
+        help="total rotation, in full turns (default: %(default)s)")
+
+    for subparser in (blend_parser, black_parser, rotate_parser):
+        subparser.add_argument(
+            "output", type=str, help='file to write, or "-" for stdout')
+        subparser.add_argument(
+            "--frames", "-n", type=int, default=64,
+            help="number of frames, including both ends (default: 64)")
+        subparser.add_argument(
+            "--reverse", "-r", action="store_true",
+            help="play the sequence backwards, e.g. to fade in from black")
+        subparser.add_argument(
+            "--dedupe", "-d", action="store_true",
+            help="drop frames that are identical to the frame before them")
+        instrument.add_argument(subparser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with instrument.stage("palette.generate"):
+        if args.command == "blend":
+            frames = fade.blend(
+                read_palette(args.start), read_palette(args.end), args.frames)
+        elif args.command == "black":
+            frames = fade.fade_to_black(
+                read_palette(args.palette), args.frames)
+        elif args.command == "rotate":
+            frames = fade.rotate_hue(
+                read_palette(args.palette), args.frames, args.turns)
+        if args.reverse:
+            frames = frames[::-1]
+        data = fade.to_vga(frames, args.dedupe)
+
+    with instrument.stage("file.write"):
+        if args.output == "-":
+            sys.stdout.buffer.write(data.tobytes())
+            sys.stdout.buffer.flush()
+        else:
+            with open(args.output, "wb") as f:
+                f.write(data.tobytes())
+    print(f"Wrote {len(data)} of {args.frames} frames", file=sys.stderr)
+
+
+def read_palette(filename):
+    with open(filename, "rb") as f:
+        return Palette.from_bytes(f.read())
+
+
+if __name__ == "__main__":
+    main()
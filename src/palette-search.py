@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+
+from lib.palette import Palette
+from lib.paletteindex import PaletteIndex
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find the stored palettes most similar to a given one"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="create a search index from a palette library")
+    build_parser.add_argument("index", type=str, help="index file to create")
+    build_parser.add_argument(
+        "palettes", type=str, nargs="+",
+        help="""VGA palette files, directories of them, or results files
+            from import-palettes.py. Results files are recognized by their
+            .tsv extension; every other file is read as a VGA palette.""")
+    build_parser.add_argument(
+        "--colors", "-c", type=int, default=16,
+        help="""number of colors per palette (default: 16); palettes of
+            other sizes are skipped""")
+
+    query_parser = subparsers.add_parser(
+        "query", help="find the closest palettes to a given palette")
+    query_parser.add_argument("index", type=str, help="index file to search")
+    query_parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    query_parser.add_argument(
+        "-k", type=int, default=5, help="number of results to show")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        names, palettes = load_library(args.palettes, args.colors)
+        PaletteIndex.from_palettes(names, palettes).save(args.index)
+    elif args.command == "query":
+        index = PaletteIndex.load(args.index)
+        with open(args.palette, "rb") as f:
+            palette = Palette.from_bytes(f.read())
+        for match in index.query(palette, args.k):
+            order = ",".join(str(i) for i in match.order)
+            print(f"{match.cost:.4f}\t{match.name}\t{order}")
+
+
+def load_library(paths, size=16):
+    """Returns (names, palettes) from palette files and results files.
+
+    Files ending in .tsv are read as import-palettes.py results files: one
+    palette per line, as 6 hex digits per color, a tab, and the name. All
+    other files are read as binary VGA palettes. An index can only hold
+    palettes of one size, so palettes without exactly size colors are
+    skipped, with a message on stderr.
+    """
+    names = []
+    palettes = []
+
+    def add(name, palette):
+        if len(palette) != size:
+            print(f"Skipping {name}: {len(palette)} colors, not {size}",
+                  file=sys.stderr)
+            return
+        palettes.append(palette)
+        names.append(name)
+
+    for path in _expand(paths):
+        data = path.read_bytes()
+        try:
+            if path.suffix == ".tsv":
+                for line in data.decode("utf-8").splitlines():
+                    hex_str, name = line.split("\t", 1)
+                    add(name, Palette.from_bytes(bytes.fromhex(hex_str)))
+            else:
+                add(str(path), Palette.from_bytes(data))
+        except ValueError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    return names, palettes
+
+
+def _expand(paths):
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            yield path
+
+
+if __name__ == "__main__":
+    main()
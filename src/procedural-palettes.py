@@ -1,36 +1,106 @@
 #!/usr/bin/env python3
 # Generate some color palettes with code.
+import argparse
 import itertools
-import pathlib
+import multiprocessing
 
-from lib.palette import Palette
-from lib.oklab import to_oklab, to_srgb
+import numpy as np
 
-PALETTES_DIR = pathlib.Path(__file__).parent.parent / "goodies" / "palettes"
+from lib import instrument
+from lib.goodies import PALETTES_DIR, PALETTE_RULES
+from lib.palette import Palette, cost_matrix, hybrid_distance
+from lib.oklab import to_oklab, to_srgb, to_oklab_array, to_srgb_array
 
 
-def main():
-    # Generate some procedural palettes
-    palettes = {
-        "scatter.pal": generate_quasirandom_r3(),
-        "rgb332.pal": generate_rgb332()
-    }
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "optimize":
+        palette = generate_maxmin(
+            seed=args.seed, restarts=args.restarts,
+            iterations=args.iterations, pinned=args.pin, ramp=args.ramp,
+            vga=args.vga, processes=args.jobs)
+        with open(args.goal, "rb") as f:
+            palette.reorder(Palette.from_bytes(f.read()))
+        with instrument.stage("file.write"):
+            with open(args.output, "wb") as f:
+                f.write(bytes(palette))
+    else:
+        generate_goodies()
 
-    # Get CGA palette so we can reorder our procedural palettes
-    with open(PALETTES_DIR / "cga.pal", "rb") as f:
-        cga = Palette.from_bytes(f.read())
 
-    # Write palettes to disk
-    for filename, palette in palettes.items():
-        palette.reorder(cga)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="""
+            Generate color palettes with code. With no arguments, regenerates
+            the procedural palettes in goodies/palettes.
+            """
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    optimize = subparsers.add_parser(
+        "optimize",
+        help="search for a palette whose colors are as distinct as possible")
+    optimize.add_argument("output", type=str, help="palette file to write")
+    optimize.add_argument(
+        "--seed", type=int, default=0,
+        help="random seed; the same seed always gives the same palette")
+    optimize.add_argument(
+        "--restarts", type=int, default=16,
+        help="number of independent searches to run")
+    optimize.add_argument(
+        "--iterations", type=int, default=2000,
+        help="number of improvement steps per search")
+    optimize.add_argument(
+        "--pin", type=parse_hex_color, action="append", default=[],
+        metavar="RRGGBB", help="keep this color in the palette (repeatable)")
+    optimize.add_argument(
+        "--ramp", action="store_true",
+        help="space the colors' lightnesses evenly from black to white")
+    optimize.add_argument(
+        "--vga", action="store_true",
+        help="only use colors that VGA's 6-bit DAC can represent exactly")
+    optimize.add_argument(
+        "--goal", type=str, default=str(PALETTES_DIR / "cga.pal"),
+        help="palette whose color order to imitate (default: cga.pal)")
+    optimize.add_argument(
+        "--jobs", "-j", type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    if args.command == "optimize" and len(args.pin) >= 16:
+        parser.error("at most 15 colors can be pinned, leaving one to search")
+    instrument.configure(args.profile)
+    return args
+
+
+def parse_hex_color(s):
+    """Parses strings like "ff8000" or "#FF8000" into an (r, g, b) tuple"""
+    data = bytes.fromhex(s.lstrip("#"))
+    if len(data) != 3:
+        raise ValueError(f"Not an RGB hex color: {s}")
+    return tuple(x/255 for x in data)
+
+
+def generate_goodies():
+    """Regenerates all of the procedural palettes in goodies/palettes"""
+    for filename in PALETTE_RULES:
+        generate_goodie(filename)
+
+
+def generate_goodie(filename):
+    """Regenerates one of the palettes listed in PALETTE_RULES"""
+    generator, goal = PALETTE_RULES[filename]
+    with instrument.stage("palette.generate"):
+        palette = globals()[generator]()
+
+    # Reorder the palette to resemble the goal, e.g. CGA's color order
+    if goal:
+        with open(PALETTES_DIR / goal, "rb") as f:
+            palette.reorder(Palette.from_bytes(f.read()))
+
+    with instrument.stage("file.write"):
         with open(PALETTES_DIR / filename, "wb") as f:
             f.write(bytes(palette))
 
-    # Generate some non-reordered palettes
-    ramp8 = generate_ramp8()
-    with open(PALETTES_DIR / 'ramp8.pal', 'wb') as f:
-        f.write(bytes(ramp8))
-
 
 def generate_quasirandom_r3():
     """Returns a color palette from Martin Roberts's quasirandom sequence R3.
@@ -83,5 +153,125 @@ def generate_ramp8():
     return Palette(rgb_colors + rgb_colors)
 
 
+def generate_maxmin(seed=0, restarts=16, iterations=2000, pinned=(),
+                    ramp=False, vga=False, processes=None):
+    """Searches for a palette whose colors are all far apart from each other.
+
+    The search maximizes the minimum hybrid OKLAB distance between any two
+    colors in the palette. Each restart is an independent randomized hill
+    climb, and restarts are spread across a pool of worker processes. Every
+    restart gets its own random stream derived from the seed, so the result
+    only depends on the arguments, not on the number of processes.
+
+    Constraints:
+    - pinned colors (RGB tuples) are always included, unchanged.
+    - ramp spaces the free colors' lightnesses evenly from black to white,
+      skipping the lightnesses closest to any pinned colors.
+    - vga restricts colors to those representable with 6 bits per channel.
+    """
+    streams = np.random.SeedSequence(seed).spawn(restarts)
+    jobs = [(stream, iterations, tuple(pinned), ramp, vga)
+            for stream in streams]
+    with instrument.stage("palette.optimize"):
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_maxmin_restart, jobs)
+
+    # Take the best score, breaking ties by restart order
+    _, colors = max(results, key=lambda r: r[0])
+    return Palette([tuple(c) for c in colors])
+
+
+def _maxmin_restart(job, batch_size=64):
+    """Runs one restart of generate_maxmin(), returning (score, colors)"""
+    stream, iterations, pinned, ramp, vga = job
+    rng = np.random.default_rng(stream)
+    num_pinned = len(pinned)
+    num_free = 16 - num_pinned
+    pinned = np.array(pinned, dtype=float).reshape(-1, 3)
+
+    # Free colors are searched in RGB, or in OKLAB with fixed lightnesses for
+    # a ramp. lightness is None when lightnesses aren't fixed.
+    lightness = None
+    if ramp:
+        targets = list(np.linspace(0, 1, 16))
+        for lab in to_oklab_array(pinned):
+            targets.remove(min(targets, key=lambda t: abs(t - lab[0])))
+        lightness = np.array(targets)
+
+    def to_colors(params, slots):
+        """Maps free colors' search params to (rgb, lab, valid)"""
+        if lightness is None:
+            rgb = np.clip(params, 0, 1)
+            valid = np.ones(len(params), dtype=bool)
+        else:
+            lab = params.copy()
+            lab[:, 0] = lightness[slots]
+            rgb = to_srgb_array(lab)
+            valid = np.all((rgb >= -1e-9) & (rgb <= 1 + 1e-9), axis=-1)
+            rgb = np.clip(rgb, 0, 1)
+        if vga:
+            rgb = np.round(rgb*63)/63
+        return rgb, to_oklab_array(rgb), valid
+
+    # Start from random colors. Ramps start near gray, which is always in
+    # gamut, and fall back to gray for any colors that aren't.
+    slots = np.arange(num_free)
+    if lightness is None:
+        params = rng.random((num_free, 3))
+    else:
+        params = np.zeros((num_free, 3))
+        params[:, 1:] = rng.normal(0, 0.02, (num_free, 2))
+        _, _, valid = to_colors(params, slots)
+        params[~valid] = 0
+    rgb, lab, _ = to_colors(params, slots)
+    colors = np.concatenate([pinned, rgb])
+    lab = np.concatenate([to_oklab_array(pinned), lab])
+
+    for i in range(iterations):
+        # For each color, find the closest pair that doesn't involve it
+        dists = _pair_distances(lab)
+        score = dists.min()
+        masked = np.repeat(dists[np.newaxis], 16, axis=0)
+        masked[np.arange(16), np.arange(16), :] = np.inf
+        masked[np.arange(16), :, np.arange(16)] = np.inf
+        others_min = masked.min(axis=(1, 2))
+
+        # Try nudging one free color per candidate, with shrinking steps
+        step = 0.2 * (1 - i/iterations) + 0.005
+        which = rng.integers(num_free, size=batch_size)
+        nudges = rng.normal(0, step, (batch_size, 3))
+        if lightness is not None:
+            nudges[:, 0] = 0
+        candidates = params[which] + nudges
+        if lightness is None:
+            candidates = np.clip(candidates, 0, 1)
+        new_rgb, new_lab, valid = to_colors(candidates, which)
+
+        # Score every candidate palette by its closest pair of colors
+        index = num_pinned + which
+        new_dists = hybrid_distance(new_lab[:, np.newaxis], lab)
+        new_dists[np.arange(batch_size), index] = np.inf
+        scores = np.minimum(new_dists.min(axis=1), others_min[index])
+        scores[~valid] = -np.inf
+
+        best = np.argmax(scores)
+        if scores[best] >= score:
+            params[which[best]] = candidates[best]
+            colors[index[best]] = new_rgb[best]
+            lab[index[best]] = new_lab[best]
+
+    return _pair_distances(lab).min(), colors
+
+
+def _pair_distances(lab):
+    """Returns the distances between all pairs of distinct colors.
+
+    A color's distance to itself is reported as infinity.
+    """
+    dists = cost_matrix(lab, lab)
+    np.fill_diagonal(dists, np.inf)
+    return dists
+
+
 if __name__ == "__main__":
     main()
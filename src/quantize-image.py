@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+import argparse
+
+from PIL import Image
+
+from lib.palette import Palette
+from lib.quantize import quantize, quantize_image
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Map an image onto a 16-color VGA palette"
+    )
+    parser.add_argument("input", type=str, help="image file to convert")
+    parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    parser.add_argument("output", type=str, help="name for the converted file")
+    parser.add_argument(
+        "--raw", "-r", action="store_true",
+        help="write raw palette indexes (1 byte/pixel) instead of an image")
+    args = parser.parse_args(argv)
+
+    with open(args.palette, "rb") as f:
+        palette = Palette.from_bytes(f.read())
+
+    with Image.open(args.input) as im:
+        if args.raw:
+            with open(args.output, "wb") as f:
+                f.write(quantize(im, palette).tobytes())
+        else:
+            quantize_image(im, palette).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+
+from lib import instrument, textmode
+from lib.font import Font
+from lib.palette import Palette
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render text-mode screen buffers as images"
+    )
+    parser.add_argument(
+        "input", type=str,
+        help="screen buffer to render (2 bytes/cell: char, attribute)")
+    parser.add_argument("font", type=str, help="font file in DOS format")
+    parser.add_argument(
+        "palette", type=str, help="palette file in VGA format (.pal)")
+    parser.add_argument("output", type=str, help="name for the image")
+    parser.add_argument(
+        "--batch", "-b", action="store_true",
+        help="treat input and output as directories, and render every file")
+    parser.add_argument(
+        "--cols", type=int, default=80, help="screen width in characters")
+    parser.add_argument(
+        "--rows", type=int, default=None,
+        help="screen height in characters (default: as many as fit)")
+    parser.add_argument(
+        "--no-blink", dest="blink", action="store_false",
+        help="use the high attribute bit for bright backgrounds, not blinking")
+    parser.add_argument(
+        "--blink-hidden", dest="blink_visible", action="store_false",
+        help="draw blinking characters in their hidden phase")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with open(args.font, "rb") as f:
+        font = Font(f.read())
+    with open(args.palette, "rb") as f:
+        palette = Palette.from_bytes(f.read())
+    options = dict(cols=args.cols, rows=args.rows, blink=args.blink,
+                   blink_visible=args.blink_visible)
+
+    if args.batch:
+        render_dir(args.input, args.output, font, palette, **options)
+    else:
+        render_file(args.input, args.output, font, palette, **options)
+
+
+def render_file(input_name, output_name, font, palette, cols=80, rows=None,
+                blink=True, blink_visible=True):
+    """Renders a screen buffer file to an image file"""
+    with instrument.stage("file.read"):
+        with open(input_name, "rb") as f:
+            data = f.read()
+    chars, attrs = textmode.from_bytes(data, cols, rows)
+    with instrument.stage("screen.render"):
+        im = textmode.render(chars, attrs, font, palette, blink,
+                             blink_visible)
+    with instrument.stage("image.encode"):
+        im.save(output_name)
+
+
+def render_dir(input_dir, output_dir, font, palette, **options):
+    """Renders every screen buffer in a directory, as "{name}.png".
+
+    The font's glyph atlas is built once and shared by every screen.
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for path in sorted(pathlib.Path(input_dir).iterdir()):
+        if not path.is_file():
+            continue
+        output_name = output_dir / f"{path.name}.png"
+        try:
+            render_file(path, output_name, font, palette, **options)
+        except ValueError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
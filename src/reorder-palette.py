@@ -1,24 +1,57 @@
 #!/usr/bin/env python3
 import argparse
+import sys
+import time
 
-from lib.palette import Palette
-
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "palettes", type=str, nargs="+",
-    help="palette file(s) to rearrange")
-parser.add_argument(
-    "-g", "--goal", type=str,
-    help="target palette to try to approximate")
-args = parser.parse_args()
-
-with open(args.goal, "rb") as f:
-    goal_palette = Palette.from_bytes(f.read())
-
-for filename in args.palettes:
-    with open(filename, "r+b") as f:
-        palette = Palette.from_bytes(f.read())
-        palette.reorder(goal_palette)
-        f.seek(0)
-        f.truncate()
-        f.write(bytes(palette))
+from lib import instrument
+from lib.palette import Palette, reorder_all
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="""
+            Rearrange VGA palettes to resemble a target palette. Palettes can
+            have any number of colors up to 256, and don't need to be the
+            same size as the target.
+            """
+    )
+    parser.add_argument(
+        "palettes", type=str, nargs="+",
+        help="palette file(s) to rearrange")
+    parser.add_argument(
+        "-g", "--goal", type=str, required=True,
+        help="target palette to try to approximate")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    instrument.add_argument(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.profile)
+
+    with open(args.goal, "rb") as f:
+        goal_palette = Palette.from_bytes(f.read())
+
+    start = time.perf_counter()
+
+    palettes = []
+    with instrument.stage("file.read"):
+        for filename in args.palettes:
+            with open(filename, "rb") as f:
+                palettes.append(Palette.from_bytes(f.read()))
+
+    reorder_all(palettes, goal_palette, processes=args.jobs)
+
+    with instrument.stage("file.write"):
+        for filename, palette in zip(args.palettes, palettes):
+            with open(filename, "wb") as f:
+                f.write(bytes(palette))
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Reordered {len(palettes)} palettes in {elapsed:.2f}s "
+        f"({len(palettes)/elapsed:.0f} files/sec)",
+        file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Runs any of the text-mode tools as a subcommand.
+
+    tme.py convert-bdf font.bdf font.f16 --height 16
+    tme.py batch < jobs.ndjson
+    tme.py batch --socket /tmp/tme.sock
+
+Each subcommand is one of the scripts in this directory, and is only
+imported when it's run, so e.g. converting a palette never pays for
+importing PIL or scipy.
+
+In batch mode, jobs are read as newline-delimited JSON objects, like:
+
+    {"id": 1, "command": "convert-palette", "args": ["in.hex", "out.pal"]}
+
+and each job is answered with a single line of JSON, in order:
+
+    {"id": 1, "status": 0, "stdout": "", "stderr": ""}
+
+where status is the job's exit status. Tools that write binary data to
+stdout (e.g. with "-" as the output file) get it back in "stdout" too,
+decoded as UTF-8 with any invalid bytes escaped as lone surrogates, so
+json.loads() and .encode("utf-8", "surrogateescape") recover the bytes
+exactly. All jobs run one after another in the same process, so imports and
+caches stay warm between jobs. Relative paths are relative to the batch
+process's working directory. With --profile, stage timings are summed over
+every job.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import traceback
+
+from lib.scripts import load_script
+
+# Subcommand name -> short description. Each name is also a script's name.
+COMMANDS = {
+    "benchmark": "time the conversion code on synthetic inputs",
+    "build-goodies": "rebuild the generated files in goodies/",
+    "convert-bdf": "convert BDF fonts into DOS font format",
+    "convert-palette": "convert a text-based palette to VGA format",
+    "dither-image": "dither an image onto a 16-color VGA palette",
+    "font-bank": "pack many DOS fonts into a single font bank, and back",
+    "font-diff": "compare DOS fonts glyph by glyph",
+    "font-sheet": "render many DOS fonts side by side in one image",
+    "image-to-animation": "convert image sequences to text-mode animations",
+    "image-to-font": "convert bitmap images to EGA fonts, and vice-versa",
+    "image-to-textmode": "convert an image to a text-mode screen",
+    "import-palettes": "convert many text-based palettes to VGA format",
+    "palette-fade": "generate palette sequences for fades and color cycling",
+    "palette-search": "find the stored palettes most similar to a given one",
+    "procedural-palettes": "generate color palettes with code",
+    "quantize-image": "map an image onto a 16-color VGA palette",
+    "render-screen": "render text-mode screen buffers as images",
+    "reorder-palette": "rearrange palettes to resemble a target palette",
+}
+
+
+def main():
+    command_list = "\n".join(
+        f"  {name:20} {help}" for name, help in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Run one of the text-mode tools",
+        epilog=f"commands:\n{command_list}\n"
+               f"  {'batch':20} run many jobs in one warm process\n\n"
+               f"Run 'tme.py COMMAND --help' for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "command", type=str, choices=[*COMMANDS, "batch"],
+        metavar="COMMAND", help="tool to run")
+    parser.add_argument(
+        "args", nargs=argparse.REMAINDER, help="arguments for the tool")
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        batch(args.args)
+    else:
+        sys.exit(run(args.command, args.args))
+
+
+def batch(argv):
+    """Handles the batch subcommand"""
+    parser = argparse.ArgumentParser(
+        prog="tme.py batch",
+        description="""
+            Run newline-delimited JSON jobs in a single process, reading
+            from stdin and answering on stdout
+            """
+    )
+    parser.add_argument(
+        "--socket", type=str, metavar="PATH",
+        help="""
+            Listen on a Unix socket at PATH instead of stdin/stdout. Each
+            connection can send any number of jobs; connections are served
+            one at a time.
+            """
+    )
+    parser.add_argument(
+        "--profile", type=str, metavar="FILE",
+        help="record stage timings for all jobs (see the tools' --profile)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        from lib import instrument
+        instrument.configure(args.profile)
+
+    if args.socket:
+        server = socketserver.UnixStreamServer(args.socket, _JobHandler)
+        with server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(args.socket)
+    else:
+        serve(sys.stdin, sys.stdout)
+
+
+def serve(lines, output):
+    """Runs the jobs in an iterable of JSON lines, writing replies to output"""
+    for line in lines:
+        if line.strip():
+            output.write(json.dumps(run_job(line)) + "\n")
+            output.flush()
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lines = io.TextIOWrapper(self.rfile, encoding="utf-8")
+        output = io.TextIOWrapper(self.wfile, encoding="utf-8")
+        serve(lines, output)
+
+
+def run_job(line):
+    """Runs one JSON-encoded job, returning the reply as a dict"""
+    job = None
+    try:
+        job = json.loads(line)
+        command = job["command"]
+        args = job.get("args", [])
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command: {command}")
+        if not all(isinstance(arg, str) for arg in args):
+            raise ValueError("Job arguments must be strings")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        job_id = job.get("id") if isinstance(job, dict) else None
+        return {"id": job_id, "status": 2, "stdout": "",
+                "stderr": f"Invalid job: {e!r}\n"}
+
+    # Backed by bytes, so that tools can write to sys.stdout.buffer
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8",
+                              errors="surrogateescape", write_through=True)
+    stderr = io.StringIO()
+    with contextlib.redirect_stdout(stdout), \
+            contextlib.redirect_stderr(stderr):
+        try:
+            status = run(command, args)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    output = stdout.buffer.getvalue().decode("utf-8", "surrogateescape")
+    return {"id": job.get("id"), "status": status,
+            "stdout": output, "stderr": stderr.getvalue()}
+
+
+def run(command, args):
+    """Runs a tool in this process, returning its exit status.
+
+    Exceptions other than SystemExit are passed through to the caller.
+    """
+    module = load_script(command)
+    old_argv = sys.argv
+    sys.argv = [f"{command}.py", *args]
+    try:
+        module.main(list(args))
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    finally:
+        sys.argv = old_argv
+    return 0
+
+
+if __name__ == "__main__":
+    main()